@@ -1,17 +1,76 @@
-from flask import Flask, render_template, request, jsonify
+from startup import lazy_import, mark, print_startup_report, startup_report
+from flask import Flask, Response, g, render_template, request, jsonify
+import io
+import json
 import os
-from dispute_assistant import process_image, save_dispute_info
-from werkzeug.utils import secure_filename
+from dispute_assistant import (
+    extract_text_from_image, extract_personal_info, extract_contact_info, process_dispute as analyze_dispute,
+    generate_dispute_letter, load_environment, ocr_ladder_stats
+)
+from ocr_cache import get_ocr_cache
+from job_queue import DONE_EVENT, JobQueue, QueueFullError, check_cancelled, publish
+from case_session import CaseRegistry
+from case_store import get_case_store
+from voice_generator import get_twiml_store
+from metrics import current_trace_id, register_callback, render_prometheus, reset_trace_id, set_trace_id
+from ocr_service import get_ocr_service
+from image_hash import dhash, get_duplicate_index
+import time
+import uuid
 
 app = Flask(__name__)
 
-# Configure upload folders
-app.config['PERSONAL_FOLDER'] = 'personal_info'
-app.config['CONTACT_FOLDER'] = 'contact_info'
+# App settings below come from the environment, so .env is needed now (OCR and Twilio stay lazy)
+load_environment()
 
-# Ensure the upload folders exist
-os.makedirs(app.config['PERSONAL_FOLDER'], exist_ok=True)
-os.makedirs(app.config['CONTACT_FOLDER'], exist_ok=True)
+# Uploads are kept in memory per case, so cap their size
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', 16 * 1024 * 1024))
+app.config['CASE_TTL'] = int(os.getenv('CASE_TTL', 1800))
+
+# Background processing limits
+app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', 2))
+app.config['JOB_MAX_QUEUED'] = int(os.getenv('JOB_MAX_QUEUED', 32))
+app.config['JOB_TTL'] = int(os.getenv('JOB_TTL', 600))
+
+jobs = JobQueue(
+    workers=app.config['JOB_WORKERS'],
+    max_queued=app.config['JOB_MAX_QUEUED'],
+    ttl=app.config['JOB_TTL']
+)
+
+cases = CaseRegistry(ttl=app.config['CASE_TTL'])
+
+register_callback('dispute_job_queue_depth', 'Jobs waiting for a worker', jobs.depth)
+register_callback('dispute_jobs', 'Tracked jobs by status', lambda: jobs.stats()['jobs'], labelname='status')
+register_callback('dispute_active_cases', 'Live upload cases', lambda: len(cases))
+register_callback(
+    'dispute_ocr_batches_total', 'Tesseract runs made by the OCR service',
+    lambda: get_ocr_service().stats()['batches'] if get_ocr_service() else None, metric_type='counter'
+)
+register_callback(
+    'dispute_duplicate_uploads_total', 'Uploads matched to an earlier copy of the same screenshot',
+    lambda: get_duplicate_index().hits if get_duplicate_index() else None, metric_type='counter'
+)
+register_callback(
+    'dispute_ocr_seconds_avoided_total', 'Estimated OCR time saved by reusing duplicate uploads',
+    lambda: get_duplicate_index().ocr_seconds_avoided if get_duplicate_index() else None, metric_type='counter'
+)
+
+@app.before_request
+def start_trace():
+    # Honour an upstream request ID so traces line up across services
+    g.trace_token = set_trace_id(request.headers.get('X-Request-ID') or uuid.uuid4().hex)
+
+@app.after_request
+def add_trace_header(response):
+    response.headers['X-Trace-ID'] = current_trace_id() or ''
+    return response
+
+@app.teardown_request
+def end_trace(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        reset_trace_id(token)
 
 @app.route('/')
 def index():
@@ -34,54 +93,215 @@ def upload_file():
     if not all([twilio_sid, twilio_token, twilio_from_number, twilio_to_number]):
         return jsonify({'success': False, 'error': 'All Twilio credentials are required'})
     
-    # 保存 Twilio 凭证到环境变量
-    os.environ['TWILIO_ACCOUNT_SID'] = twilio_sid
-    os.environ['TWILIO_AUTH_TOKEN'] = twilio_token
-    os.environ['TWILIO_FROM_NUMBER'] = twilio_from_number
-    os.environ['TWILIO_TO_NUMBER'] = twilio_to_number
-    
     if file.filename == '':
         return jsonify({'success': False, 'error': 'No selected file'})
     
     if file and file_type:
-        filename = secure_filename(file.filename)
-        if file_type == 'personal':
-            filepath = os.path.join(app.config['PERSONAL_FOLDER'], 'personal.png')
+        # Read the upload straight into memory and make sure PIL can parse it
+        data = file.read()
+        try:
+            lazy_import("PIL.Image").open(io.BytesIO(data)).verify()
+        except Exception:
+            return jsonify({'success': False, 'error': 'Uploaded file is not a valid image'})
+        
+        # Credentials live on the caller's case, never in os.environ
+        credentials = {
+            'account_sid': twilio_sid,
+            'auth_token': twilio_token,
+            'from_number': twilio_from_number,
+            'to_number': twilio_to_number
+        }
+        case = cases.get(request.form.get('case_id', ''))
+        if case is None:
+            case = cases.create(credentials)
         else:
-            filepath = os.path.join(app.config['CONTACT_FOLDER'], 'contact.png')
+            case.credentials = credentials
+        image_type = 'personal' if file_type == 'personal' else 'contact'
+        
+        # Re-uploads of this user's earlier screenshots (even recompressed or resized) reuse their OCR text
+        image_hash = duplicate = None
+        index = get_duplicate_index()
+        if index is not None:
+            image_hash = dhash(data)
+            duplicate = index.lookup(twilio_sid, image_type, image_hash, data)
+        case.add_image(image_type, data, image_hash, duplicate)
         
-        file.save(filepath)
-        return jsonify({'success': True})
+        response = {'success': True, 'case_id': case.id}
+        if duplicate:
+            response['duplicate_of'] = duplicate['case_id']
+            response['distance'] = duplicate['distance']
+        return jsonify(response)
     
     return jsonify({'success': False, 'error': 'Invalid request'})
 
+def case_image_text(case, image_type, result):
+    """OCR text of one case image, reused from a confirmed duplicate upload when there is one"""
+    duplicate = case.duplicates.get(image_type)
+    if duplicate:
+        result.setdefault('reused_from', {})[image_type] = duplicate['case_id']
+        return duplicate['text']
+    start = time.perf_counter()
+    text = extract_text_from_image(case.images[image_type], info_type=image_type)
+    index = get_duplicate_index()
+    if text and index is not None and case.image_hashes.get(image_type) is not None:
+        index.add(case.credentials.get('account_sid'), image_type, case.image_hashes[image_type],
+                  case.images[image_type], case.id, text, time.perf_counter() - start)
+    return text
+
+def run_dispute_job(case):
+    """Process both uploaded images of a case (runs on a job worker)"""
+    # OCR reads the in-memory uploads and goes through the shared cache
+    # Each stage's output is published as soon as it's ready for /jobs/<id>/events,
+    # and a cancelled job stops before starting the next stage
+    result = {}
+    check_cancelled()
+    personal_text = case_image_text(case, 'personal', result)
+    publish('ocr', {'image': 'personal', 'text': personal_text})
+    if personal_text:
+        result['personal'] = extract_personal_info(personal_text)
+        publish('fields', {'image': 'personal', 'fields': result['personal']})
+        result['dispute'] = analyze_dispute(personal_text)
+        publish('category', {
+            'dispute_category': result['dispute']['dispute_category'],
+            'confidence': result['dispute']['confidence'],
+            'suggested_template': result['dispute']['suggested_template']
+        })
+    check_cancelled()
+    contact_text = case_image_text(case, 'contact', result)
+    publish('ocr', {'image': 'contact', 'text': contact_text})
+    if contact_text:
+        result['contact'] = extract_contact_info(contact_text)
+        publish('fields', {'image': 'contact', 'fields': result['contact']})
+    check_cancelled()
+    if 'dispute' in result:
+        result['letter'] = generate_dispute_letter(result)
+        publish('letter', {'template': result['dispute']['suggested_template'], 'letter': result['letter']})
+    result['trace_id'] = current_trace_id()
+    result['case_id'] = get_case_store().save_case(result, case_id=case.id, text=personal_text)
+    result['ocr_cache'] = get_ocr_cache().stats()
+    result['ocr_ladder'] = ocr_ladder_stats()
+    index = get_duplicate_index()
+    if index is not None:
+        result['duplicates'] = index.stats()
+    return result
+
 @app.route('/process', methods=['POST'])
 def process_dispute():
     try:
-        # Process personal info
-        personal_path = os.path.join(app.config['PERSONAL_FOLDER'], 'personal.png')
-        contact_path = os.path.join(app.config['CONTACT_FOLDER'], 'contact.png')
+        data = request.get_json(silent=True) or request.form
+        case = cases.get(data.get('case_id', ''))
+        if case is None:
+            return jsonify({
+                'success': False,
+                'error': 'Unknown or expired case'
+            })
         
-        if not (os.path.exists(personal_path) and os.path.exists(contact_path)):
+        if not case.has_images('personal', 'contact'):
             return jsonify({
                 'success': False, 
                 'error': 'Missing required files'
             })
 
-        # Run the dispute assistant
-        import dispute_assistant
-        result = dispute_assistant.main()
+        # Run the dispute assistant in the background
+        job = jobs.submit(run_dispute_job, case)
         
         return jsonify({
             'success': True,
-            'message': 'Dispute processed successfully'
-        })
+            'job_id': job.id,
+            'status': job.status
+        }), 202
         
+    except QueueFullError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         })
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify(dict(job.to_dict(), success=True))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-Sent Events stream of a job's stage results, ending with a 'done' event"""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    
+    # EventSource sends the last id it saw when it reconnects, so resume from there
+    try:
+        start = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        start = 0
+    
+    def stream():
+        position = start
+        while True:
+            events = job.wait_for_events(position, timeout=15)
+            if not events:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            for event, data in events:
+                position += 1
+                yield f"id: {position}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+                if event == DONE_EVENT:
+                    return
+    
+    response = Response(stream(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    job = jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify(dict(job.to_dict(), success=True))
+
+@app.route('/twiml/<twiml_hash>', methods=['GET', 'POST'])
+def serve_twiml(twiml_hash):
+    # Twilio fetches the call script from here instead of receiving it inline
+    document = get_twiml_store().get(twiml_hash)
+    if document is None:
+        return Response('Not found', status=404, mimetype='text/plain')
+    response = Response(document, mimetype='application/xml')
+    response.headers['Cache-Control'] = 'public, max-age=86400, immutable'
+    return response
+
+@app.route('/calls/status', methods=['POST'])
+def call_status():
+    # Twilio reports the SID of a scheduled call attempt here, so the scheduler can match it exactly
+    try:
+        call_id = int(request.args['scheduled_call'])
+        attempt = int(request.args['attempt'])
+    except (KeyError, ValueError):
+        return Response('Bad request', status=400, mimetype='text/plain')
+    call_sid = request.form.get('CallSid')
+    if call_sid:
+        get_case_store().set_callback_sid(call_id, attempt, call_sid)
+    return Response(status=204)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/startup', methods=['GET'])
+def startup_info():
+    return jsonify(startup_report())
+
+mark("app ready")
+
 if __name__ == '__main__':
+    if os.getenv('STARTUP_REPORT'):
+        print_startup_report("app")
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""Re-score many stored cases at once after the category keywords change.
+
+Texts are turned into a sparse document-term matrix of distinct keyword hits
+and every category is scored with one matrix product against a term-category
+weight matrix. SciPy is used for the product when it is installed; otherwise
+the same sparse rows are accumulated in pure Python.
+
+    python batch_classifier.py                            # diff report only
+    python batch_classifier.py --categories new.json      # try new keyword lists
+    python batch_classifier.py --weights weights.json --apply
+"""
+
+import array
+import json
+import re
+from collections import Counter
+
+from dispute_assistant import DISPUTE_CATEGORIES, summarize_category_matches
+from keyword_matcher import KeywordMatcher, normalize
+from startup import lazy_import
+
+# Word runs, and every other non-space character as a token of its own, so two
+# adjacent word tokens are always separated by exactly one space after normalize
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def _load_scipy():
+    try:
+        return lazy_import("numpy"), lazy_import("scipy.sparse")
+    except ImportError:
+        return None, None
+
+
+class BatchClassifier:
+    """Score many texts against the dispute categories in one pass.
+
+    categories maps a category to its keywords (default: DISPUTE_CATEGORIES).
+    weights maps a keyword to a weight, or a category to {keyword: weight};
+    keywords without a weight count 1. With the default weights every result
+    equals categorize_dispute(text).
+    """
+
+    def __init__(self, categories=None, weights=None, use_scipy=True):
+        self.categories = list((categories or DISPUTE_CATEGORIES).items())
+        self.terms = {}
+        # Term-category entries as parallel arrays: term index, category index, weight
+        self._rows, self._cols, self._weights = [], [], []
+        self._ngrams = {}
+        self._fallback = KeywordMatcher()
+        self._fallback_terms = []
+        weights = weights or {}
+        for col, (category, keywords) in enumerate(self.categories):
+            seen = set()
+            for keyword in keywords:
+                keyword = normalize(keyword)
+                if not keyword or keyword in seen:
+                    continue
+                seen.add(keyword)
+                weight = weights.get(keyword, 1)
+                if isinstance(weights.get(category), dict):
+                    weight = weights[category].get(keyword, weight)
+                self._rows.append(self._term_index(keyword))
+                self._cols.append(col)
+                self._weights.append(weight)
+        self.integral = all(float(w).is_integer() for w in self._weights)
+        if self.integral:
+            self._weights = [int(w) for w in self._weights]
+        self._numpy, self._sparse = _load_scipy() if use_scipy else (None, None)
+        self._matrix = None
+        if self._sparse is not None:
+            np = self._numpy
+            self._matrix = self._sparse.csr_matrix(
+                (np.array(self._weights, dtype=np.int64 if self.integral else np.float64),
+                 (np.array(self._rows, dtype=np.int64), np.array(self._cols, dtype=np.int64))),
+                shape=(len(self.terms), len(self.categories))
+            )
+
+    def _term_index(self, keyword):
+        index = self.terms.get(keyword)
+        if index is not None:
+            return index
+        index = self.terms[keyword] = len(self.terms)
+        tokens = tuple(_TOKEN.findall(keyword))
+        if " ".join(tokens) == keyword:
+            self._ngrams.setdefault(len(tokens), {})[tokens if len(tokens) > 1 else tokens[0]] = index
+        else:
+            # Keywords with punctuation need the exact character matcher
+            self._fallback.add(index, [keyword])
+            self._fallback_terms.append(index)
+        return index
+
+    def term_ids(self, text):
+        """Indices of the distinct keywords found in text (same matches as KeywordMatcher)"""
+        tokens = []
+        for piece in text.lower().split():
+            # Most pieces are plain words; only run the tokenizer on ones with punctuation
+            if piece.isalnum():
+                tokens.append(piece)
+            else:
+                tokens.extend(_TOKEN.findall(piece))
+        found = []
+        for n, grams in self._ngrams.items():
+            if n == 1:
+                found.extend(grams[token] for token in grams.keys() & set(tokens))
+            else:
+                present = set(zip(*(tokens[i:] for i in range(n))))
+                found.extend(grams[gram] for gram in grams.keys() & present)
+        if self._fallback_terms:
+            found.extend(index for index, hits in self._fallback.scan(text).items() if hits)
+        return found
+
+    def document_term_matrix(self, texts):
+        """CSR parts (indptr, indices) of the binary document-term matrix"""
+        indptr = array.array("q", [0])
+        indices = array.array("q")
+        for text in texts:
+            indices.extend(self.term_ids(text or ""))
+            indptr.append(len(indices))
+        return indptr, indices
+
+    def scores(self, texts):
+        """Per-document category score rows, in self.categories order"""
+        indptr, indices = self.document_term_matrix(texts)
+        if self._matrix is not None:
+            np = self._numpy
+            doc_terms = self._sparse.csr_matrix(
+                (np.ones(len(indices), dtype=np.int64), np.frombuffer(indices, dtype=np.int64),
+                 np.frombuffer(indptr, dtype=np.int64)),
+                shape=(len(indptr) - 1, len(self.terms))
+            )
+            return (doc_terms @ self._matrix).toarray().tolist()
+
+        # Pure Python: the same product, one sparse row at a time
+        by_term = [[] for _ in self.terms]
+        for row, col, weight in zip(self._rows, self._cols, self._weights):
+            by_term[row].append((col, weight))
+        zero = [0] * len(self.categories) if self.integral else [0.0] * len(self.categories)
+        results = []
+        for start, end in zip(indptr, indptr[1:]):
+            row = zero[:]
+            for term in indices[start:end]:
+                for col, weight in by_term[term]:
+                    row[col] += weight
+            results.append(row)
+        return results
+
+    def classify(self, texts):
+        """Return one categorize_dispute-style result per text"""
+        texts = list(texts)
+        # Stored cases repeat a lot (resubmissions, templates), so score each distinct text once
+        unique = {}
+        for text in texts:
+            unique.setdefault(text, len(unique))
+        names = [category for category, _ in self.categories]
+        summaries = [summarize_category_matches(dict(zip(names, row))) for row in self.scores(unique)]
+        return [summaries[unique[text]] for text in texts]
+
+
+def reclassify_cases(store=None, categories=None, weights=None, apply=False, chunk_size=50000):
+    """Re-score every stored case that has its text and report which ones changed.
+
+    Cases are read and scored in chunks so memory stays flat on large archives.
+    With apply=True the new classifications are written back to the store.
+    """
+    if store is None:
+        from case_store import get_case_store
+        store = get_case_store()
+    classifier = BatchClassifier(categories, weights)
+    report = {"scored": 0, "changed": 0, "applied": 0, "transitions": Counter(), "cases": []}
+
+    def flush(chunk):
+        results = classifier.classify(text for _, text, _, _ in chunk)
+        updates = {}
+        for (case_id, _, old_category, old_confidence), result in zip(chunk, results):
+            report["scored"] += 1
+            if result["primary_category"] == old_category and result["confidence"] == old_confidence:
+                continue
+            report["changed"] += 1
+            report["transitions"][f"{old_category} -> {result['primary_category']}"] += 1
+            report["cases"].append({
+                "case_id": case_id,
+                "old_category": old_category,
+                "new_category": result["primary_category"],
+                "old_confidence": old_confidence,
+                "new_confidence": result["confidence"]
+            })
+            updates[case_id] = result
+        if apply and updates:
+            report["applied"] += store.update_categories(updates)
+
+    chunk = []
+    for row in store.iter_texts():
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    report["transitions"] = dict(report["transitions"].most_common())
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Re-classify stored cases with new keywords or weights")
+    parser.add_argument("--categories", help="JSON file of {category: [keywords]} to use instead of the defaults")
+    parser.add_argument("--weights", help="JSON file of {keyword: weight} or {category: {keyword: weight}}")
+    parser.add_argument("--apply", action="store_true", help="Write the new classifications to the case store")
+    parser.add_argument("--report", help="Write the full diff report (every changed case) to this JSON file")
+    args = parser.parse_args()
+
+    def load(path):
+        if not path:
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    start = time.perf_counter()
+    report = reclassify_cases(categories=load(args.categories), weights=load(args.weights), apply=args.apply)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {report['scored']} cases in {elapsed:.2f}s, {report['changed']} changed category or confidence")
+    for transition, count in report["transitions"].items():
+        print(f"  {transition}: {count}")
+    if args.apply:
+        print(f"Applied {report['applied']} updates")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"Report saved to {args.report}")
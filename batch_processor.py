@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from dispute_assistant import extract_text_from_image, process_dispute
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp")
+
+
+def collect_images(source):
+    """Collect image paths from a directory (recursively) or a manifest file"""
+    if os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            for name in files:
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    paths.append(os.path.join(root, name))
+        return sorted(paths)
+
+    # Manifest: one image path per line, relative to the manifest's directory
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def load_checkpoint(output_path, retry_failed=False):
+    """Return the set of images already recorded in an existing results file"""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partial line from an interrupted run
+                continue
+            if record.get("success") or not retry_failed:
+                done.add(record.get("image"))
+    return done
+
+
+def process_one(image_path):
+    """Run OCR and dispute analysis for a single image (executed in a worker process)"""
+    start = time.perf_counter()
+    record = {"image": image_path}
+    try:
+        text = extract_text_from_image(image_path, info_type="personal")
+        if not text:
+            raise ValueError("No text extracted from image")
+        record["success"] = True
+        record["result"] = process_dispute(text)
+    except Exception as e:
+        record["success"] = False
+        record["error"] = str(e)
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    return record
+
+
+def run_batch(image_paths, output_path, workers=None, retry_failed=False):
+    """Process images in parallel, appending one JSON line per image as results finish"""
+    workers = workers or os.cpu_count() or 1
+    done = load_checkpoint(output_path, retry_failed)
+    pending = [path for path in image_paths if path not in done]
+    skipped = len(image_paths) - len(pending)
+    if skipped:
+        print(f"Resuming: skipping {skipped} already processed images")
+
+    stats = {"processed": 0, "failed": 0, "skipped": skipped}
+    start = time.perf_counter()
+    max_in_flight = workers * 4
+    queue = iter(pending)
+
+    # Terminate a line left half-written by an interrupted run
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+        if needs_newline:
+            with open(output_path, "a", encoding="utf-8") as f:
+                f.write("\n")
+
+    with open(output_path, "a", encoding="utf-8") as out, \
+            ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = {}
+
+        def submit_next():
+            for path in queue:
+                in_flight[executor.submit(process_one, path)] = path
+                if len(in_flight) >= max_in_flight:
+                    return
+
+        submit_next()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = in_flight.pop(future)
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # Worker died (e.g. crashed inside Tesseract); isolate the failure
+                    record = {"image": path, "success": False, "error": str(e)}
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                stats["processed"] += 1
+                if not record["success"]:
+                    stats["failed"] += 1
+            submit_next()
+
+    stats["elapsed"] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Process a directory or manifest of dispute images")
+    parser.add_argument("source", help="Directory of images or manifest file with one path per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl",
+                        help="JSON lines output file, also used as the resume checkpoint")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Reprocess images that failed in a previous run")
+    args = parser.parse_args(argv)
+
+    images = collect_images(args.source)
+    if not images:
+        print(f"Error: No images found in {args.source}")
+        return 1
+
+    print(f"Processing {len(images)} images with {args.workers or os.cpu_count()} workers")
+    stats = run_batch(images, args.output, args.workers, args.retry_failed)
+    print(f"\nProcessed {stats['processed']} images ({stats['failed']} failed, "
+          f"{stats['skipped']} skipped) in {stats['elapsed']}s")
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of the dispute pipeline on synthetic documents.
+
+Runs fully offline: documents are drawn with PIL, caches and the case store
+live in a temporary directory, and calls go to a local fake of the Twilio API.
+
+    python benchmark.py -o bench.json                 # run and save results
+    python benchmark.py --save-baseline               # store as the baseline
+    python benchmark.py --baseline benchmark_baseline.json --threshold 0.25
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from fake_twilio import FakeTwilio
+
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+RESOLUTIONS = {
+    "small": (720, 1280),
+    "phone": (1170, 2532),
+    "tablet": (1640, 2360)
+}
+
+TEXT_LENGTHS = {"short": 1, "long": 8}
+
+FIRST_NAMES = ["Alice", "Wei", "Carlos", "Priya", "Olga", "Kenji"]
+LAST_NAMES = ["Smith", "Zhang", "Garcia", "Patel", "Ivanova", "Tanaka"]
+
+DOCUMENT_KINDS = {
+    "ets": [
+        "ETS TOEFL Registration",
+        "First / Given Name {first}",
+        "Last / Family Name {last}",
+        "ETS ID: {ets_id}",
+        "Email: {email}",
+        "Test fee refund requested after cancellation of the test center appointment.",
+        "Registration fee and payment reimbursement pending. Contact: toefl@ets.org",
+        "Phone: 1-800-468-6335"
+    ],
+    "airline": [
+        "United Airlines Booking Confirmation",
+        "Passenger: {first} {last}   Email: {email}",
+        "Flight UA 857 delay of 9 hours, reservation cancellation and rebooking.",
+        "Ticket number 016 2345678901. Travel date 2024-05-03.",
+        "Customer Relations: Phone (800) 864-8331"
+    ],
+    "ecommerce": [
+        "Amazon Order #112-3456789-0123456",
+        "Ship to {first} {last}  {email}",
+        "Item not received. Delivery status: lost. Product return requested.",
+        "Purchase total $149.99. Merchandise refund pending.",
+        "Support: 888-280-4331"
+    ],
+    "credit_card": [
+        "Chase Credit Card Statement",
+        "Cardholder {first} {last}   {email}",
+        "Unauthorized transaction charge of $420.00 flagged as possible fraud.",
+        "Dispute reference 77812. Transaction date 2024-04-11.",
+        "Call: 1-800-432-3117"
+    ]
+}
+
+
+def make_case_values(rng):
+    first = rng.choice(FIRST_NAMES)
+    last = rng.choice(LAST_NAMES)
+    return {
+        "first": first,
+        "last": last,
+        "ets_id": f"{rng.randrange(10**9):09d}",
+        "email": f"{first.lower()}.{last.lower()}@example.com"
+    }
+
+
+def make_document_text(kind, length, rng):
+    values = make_case_values(rng)
+    lines = [line.format(**values) for line in DOCUMENT_KINDS[kind]]
+    return "\n".join(lines * TEXT_LENGTHS[length])
+
+
+def render_document(text, size):
+    """Draw text onto a white screenshot-sized canvas"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = size
+    font_size = max(14, width // 40)
+    try:
+        font = ImageFont.load_default(size=font_size)
+    except TypeError:
+        # Pillow < 10.1 only has the fixed-size bitmap font
+        font = ImageFont.load_default()
+    img = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(img)
+    y = font_size
+    for line in text.split("\n"):
+        if y > height - font_size * 2:
+            break
+        draw.text((font_size, y), line, fill="black", font=font)
+        y += int(font_size * 1.6)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def time_stage(func, repeat):
+    """Run func repeat times and summarize wall time in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(samples)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(samples), 4),
+        "median_ms": round(median, 4),
+        "mean_ms": round(statistics.mean(samples), 4),
+        "ops_per_sec": round(1000 / median, 1) if median else None
+    }
+
+
+def tesseract_available():
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def run_benchmarks(repeat=5, seed=1234):
+    import dispute_assistant
+    from field_extraction import scan_fields
+    from letter_templates import render_letter
+    from voice_generator import generate_twiml
+
+    rng = random.Random(seed)
+    results = {"stages": {}, "skipped": []}
+    stages = results["stages"]
+    quiet = contextlib.redirect_stdout(io.StringIO())
+
+    texts = {(kind, length): make_document_text(kind, length, rng)
+             for kind in DOCUMENT_KINDS for length in TEXT_LENGTHS}
+
+    # Text stages run many more times than OCR since each call is tiny
+    text_repeat = repeat * 50
+    for (kind, length), text in texts.items():
+        suffix = f"{kind}.{length}"
+        # Clear the per-text scan memo so every run pays for the scan
+        with quiet:
+            stages[f"extract_personal_info.{suffix}"] = time_stage(
+                lambda: (scan_fields.cache_clear(), dispute_assistant.extract_personal_info(text)), text_repeat)
+            stages[f"extract_contact_info.{suffix}"] = time_stage(
+                lambda: (scan_fields.cache_clear(), dispute_assistant.extract_contact_info(text)), text_repeat)
+        stages[f"categorize_dispute.{suffix}"] = time_stage(
+            lambda: dispute_assistant.categorize_dispute(text), text_repeat)
+
+        with quiet:
+            info = {
+                "personal": dispute_assistant.extract_personal_info(text),
+                "contact": dispute_assistant.extract_contact_info(text),
+                "dispute": dispute_assistant.process_dispute(text)
+            }
+        stages[f"render_letter.{suffix}"] = time_stage(lambda: render_letter(info), text_repeat)
+        script = dispute_assistant.generate_voice_script(info)
+        stages[f"twiml_build.{suffix}"] = time_stage(
+            lambda: generate_twiml.__wrapped__(script), text_repeat)
+
+    # Outbound call dispatch against the local fake
+    with FakeTwilio() as twilio, quiet:
+        def place_call():
+            dispute_assistant.make_phone_call(
+                "+15550000001", "+15550000002", script="benchmark call",
+                account_sid="AC" + "0" * 32, auth_token="token", base_url=twilio.base_url
+            )
+        stages["make_phone_call.stub"] = time_stage(place_call, repeat * 4)
+
+    if not tesseract_available():
+        results["skipped"].append("ocr: tesseract is not installed")
+        return results
+
+    images = {}
+    for kind in DOCUMENT_KINDS:
+        for resolution, size in RESOLUTIONS.items():
+            for length in TEXT_LENGTHS:
+                images[(kind, resolution, length)] = render_document(texts[(kind, length)], size)
+
+    for (kind, resolution, length), image_bytes in images.items():
+        suffix = f"{kind}.{resolution}.{length}"
+        with quiet:
+            stages[f"extract_text_from_image.{suffix}"] = time_stage(
+                lambda: dispute_assistant.extract_text_from_image(image_bytes, use_cache=False), repeat)
+
+    # Full pipeline throughput, cold cache and then warm cache
+    batch = list(images.values())
+    for label in ("cold", "warm"):
+        with quiet:
+            start = time.perf_counter()
+            for image_bytes in batch:
+                dispute_assistant.process_image(image_bytes, "personal")
+            elapsed = time.perf_counter() - start
+        stages[f"process_image.throughput.{label}"] = {
+            "runs": len(batch),
+            "median_ms": round(elapsed / len(batch) * 1000, 4),
+            "images_per_sec": round(len(batch) / elapsed, 2)
+        }
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms=0.01):
+    """Return stages whose median time regressed by more than threshold (a fraction).
+
+    Differences below min_delta_ms are ignored so microsecond-level noise
+    in the text stages does not count as a regression.
+    """
+    regressions = []
+    for name, current in results["stages"].items():
+        previous = baseline.get("stages", {}).get(name)
+        if not previous or not previous.get("median_ms"):
+            continue
+        ratio = current["median_ms"] / previous["median_ms"]
+        if ratio > 1 + threshold and current["median_ms"] - previous["median_ms"] > min_delta_ms:
+            regressions.append({
+                "stage": name,
+                "baseline_ms": previous["median_ms"],
+                "current_ms": current["median_ms"],
+                "slowdown": round(ratio, 2)
+            })
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dispute pipeline on synthetic documents")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="Where to write results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown before a stage counts as a regression (0.25 = 25%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.01,
+                        help="Ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per OCR stage")
+    args = parser.parse_args(argv)
+
+    # Keep caches and the case store away from real data
+    work_dir = tempfile.mkdtemp(prefix="dispute-bench-")
+    os.environ["OCR_CACHE_DIR"] = os.path.join(work_dir, "ocr_cache")
+    os.environ["CASE_DB_PATH"] = os.path.join(work_dir, "cases.db")
+    os.environ["TWIML_STORE_DIR"] = os.path.join(work_dir, "twiml")
+    os.environ.pop("TWIML_BASE_URL", None)
+    try:
+        results = run_benchmarks(repeat=args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results["environment"] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.time()
+    }
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results saved to {args.output}")
+    for reason in results["skipped"]:
+        print(f"Skipped {reason}")
+
+    exit_code = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} stage(s) slower than baseline by more than {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"  {regression['stage']}: {regression['baseline_ms']} ms -> "
+                      f"{regression['current_ms']} ms ({regression['slowdown']}x)")
+            exit_code = 1
+        else:
+            print("\nNo regressions against baseline")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline saved to {args.baseline}")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
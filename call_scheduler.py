@@ -0,0 +1,469 @@
+#!/usr/bin/env python3
+"""Rate-limited scheduler for outbound follow-up calls across many cases.
+
+Calls wait in a durable queue in the case store. Each Twilio account has its
+own priority queue and token bucket (calls per second), a concurrency cap
+bounds calls in flight, and busy/no-answer outcomes are retried with
+exponential backoff. Every attempt is appended to its case's call history.
+
+A call is never dialed twice blindly: when a create request gets no answer
+(or the scheduler stopped mid-request) the call is marked unknown, and
+Twilio's call list is checked before deciding to dial again. With a public
+callback_base_url each attempt is tagged with a status callback, so Twilio
+reports its SID to /calls/status and the call can be matched exactly.
+
+    python call_scheduler.py enqueue --category ets_refund --priority 5
+    python call_scheduler.py run
+    python call_scheduler.py status
+    python call_scheduler.py demo                  # campaign against a local fake Twilio
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from case_store import get_case_store
+from dispute_assistant import generate_voice_script, get_config, make_phone_call
+from metrics import Counter, register, register_callback
+from startup import lazy_import
+
+PENDING = "pending"
+DIALING = "dialing"
+# The create request may or may not have placed the call
+UNKNOWN = "unknown"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Twilio call statuses after which the call is over
+FINAL_CALL_STATUSES = ("completed", "busy", "no-answer", "failed", "canceled")
+RETRY_OUTCOMES = ("busy", "no-answer")
+
+# Allowance for clock differences when matching our dial time against Twilio's date_created
+CLOCK_SKEW = 5
+
+SCHEDULED_CALL_OUTCOMES = register(Counter(
+    "dispute_scheduled_call_outcomes_total", "Outcomes of scheduled call attempts", ["outcome"]))
+
+
+class TokenBucket:
+    """Allows rate events per second on average, with bursts of up to capacity"""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        """Seconds until a token is available (0 if one is available now)"""
+        self._refill()
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self._refill()
+        self.tokens -= 1
+
+
+class CallScheduler:
+    """Dispatches queued calls under per-account rate limits and a concurrency cap.
+
+    accounts maps an account SID to its auth token; calls queued without an
+    account use the configured TWILIO_ACCOUNT_SID. State lives in the case
+    store, so a new scheduler resumes where a stopped one left off.
+    """
+
+    def __init__(self, store=None, accounts=None, rate=1.0, burst=1, max_concurrent=4,
+                 retry_backoff=60.0, poll_interval=5.0, status_timeout=600.0, base_url=None,
+                 callback_base_url=None):
+        self.store = store or get_case_store()
+        self.accounts = accounts or {get_config("TWILIO_ACCOUNT_SID"): get_config("TWILIO_AUTH_TOKEN")}
+        self.default_account = next(iter(self.accounts))
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.status_timeout = status_timeout
+        self.base_url = base_url
+        self.callback_base_url = callback_base_url.rstrip("/") if callback_base_url else None
+        self._ready = {}
+        self._delayed = []
+        self._buckets = {}
+        self._order = itertools.count()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._executor = None
+        self._dispatcher = None
+        self._loaded = False
+        self._resume = []
+
+    def enqueue(self, case_id, to_number, from_number=None, script=None, account_sid=None,
+                priority=0, max_attempts=3, delay=0):
+        """Queue a call; higher priority calls are dialed first. Returns the call id."""
+        account_sid = account_sid or self.default_account
+        call_id = self.store.schedule_call(
+            case_id, to_number, from_number, script, account_sid,
+            priority, max_attempts, time.time() + delay
+        )
+        with self._cond:
+            if self._loaded:
+                self._push(self.store.get_scheduled_call(call_id))
+            self._cond.notify_all()
+        return call_id
+
+    def enqueue_case(self, case, to_number=None, **kwargs):
+        """Queue a follow-up call for a stored case, to its contact phone by default"""
+        to_number = to_number or (case.get("contact") or {}).get("contact_phone")
+        if not to_number:
+            return None
+        return self.enqueue(case["case_id"], to_number, script=generate_voice_script(case), **kwargs)
+
+    def start(self):
+        if self._dispatcher is not None:
+            return
+        self._stop.clear()
+        self._load()
+        self._executor = ThreadPoolExecutor(self.max_concurrent, thread_name_prefix="call-worker")
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="call-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def stop(self, wait=True):
+        """Stop dispatching; calls still ringing stay 'dialing' and resume on the next start"""
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._executor.shutdown(wait=wait)
+        self._dispatcher = None
+        self._executor = None
+
+    def run_until_idle(self, timeout=None):
+        """Start, block until no call is queued, delayed or in flight, then stop"""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._idle():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        self.stop()
+        return self.stats()
+
+    def stats(self):
+        with self._cond:
+            queued = sum(len(heap) for heap in self._ready.values())
+            return {
+                "queued": queued,
+                "delayed": len(self._delayed),
+                "in_flight": self._in_flight,
+                "by_status": self.store.scheduled_call_counts()
+            }
+
+    def _idle(self):
+        return not self._in_flight and not self._delayed and not any(self._ready.values())
+
+    def _bucket(self, account_sid):
+        bucket = self._buckets.get(account_sid)
+        if bucket is None:
+            bucket = self._buckets[account_sid] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    def _push(self, call):
+        if call["not_before"] > time.time():
+            heapq.heappush(self._delayed, (call["not_before"], next(self._order), call))
+        else:
+            heap = self._ready.setdefault(call["account_sid"], [])
+            heapq.heappush(heap, (-call["priority"], call["id"], call))
+
+    def _load(self):
+        with self._cond:
+            self._ready.clear()
+            self._delayed.clear()
+            resume = []
+            for call in self.store.scheduled_calls((PENDING, DIALING, UNKNOWN)):
+                if call["status"] == DIALING and call["sid"]:
+                    resume.append(call)
+                else:
+                    # No SID came back before the stop, but the request may still have placed the call
+                    if call["status"] == DIALING:
+                        self.store.update_scheduled_call(call["id"], status=UNKNOWN)
+                        call["status"] = UNKNOWN
+                    self._push(call)
+            self._in_flight = len(resume)
+            self._loaded = True
+        self._resume = resume
+
+    def _dispatch_loop(self):
+        for call in self._resume:
+            self._executor.submit(self._run_call, call)
+        self._resume = []
+        while not self._stop.is_set():
+            with self._cond:
+                call, wait = self._next_call()
+                if call is None:
+                    self._cond.wait(wait)
+                    continue
+                self._in_flight += 1
+            self._executor.submit(self._run_call, call)
+
+    def _next_call(self):
+        """Pop the best due call whose account has a token; else return how long to wait"""
+        now = time.time()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, call = heapq.heappop(self._delayed)
+            self._push(call)
+        waits = [self._delayed[0][0] - now] if self._delayed else []
+        if self._in_flight >= self.max_concurrent:
+            return None, None
+        best = None
+        for account_sid, heap in self._ready.items():
+            if not heap:
+                continue
+            wait = self._bucket(account_sid).wait_time()
+            if wait > 0:
+                waits.append(wait)
+            elif best is None or heap[0] < self._ready[best][0]:
+                best = account_sid
+        if best is None:
+            return None, min(waits) if waits else None
+        self._bucket(best).consume()
+        return heapq.heappop(self._ready[best])[2], None
+
+    def _client(self, call):
+        return lazy_import("twilio_client").get_call_client(
+            call["account_sid"], self.accounts.get(call["account_sid"]), self.base_url)
+
+    def _run_call(self, call):
+        try:
+            if call["status"] == UNKNOWN and not self._reconcile(call):
+                return
+            if not call["sid"]:
+                # Record the attempt before dialing, so a restart knows the call may exist
+                call.update(status=DIALING, attempts=call["attempts"] + 1, dialed_at=time.time())
+                self.store.update_scheduled_call(call["id"], status=DIALING, attempts=call["attempts"],
+                                                 dialed_at=call["dialed_at"], callback_sid=None)
+                result = make_phone_call(
+                    call["to_number"], call["from_number"], call["script"],
+                    account_sid=call["account_sid"], auth_token=self.accounts.get(call["account_sid"]),
+                    base_url=self.base_url, status_callback=self._status_callback(call)
+                )
+                if result is None or result.unknown:
+                    # No answer to the create request: look for the call instead of dialing again
+                    call["status"] = UNKNOWN
+                    self.store.update_scheduled_call(call["id"], status=UNKNOWN)
+                    if not self._reconcile(call):
+                        return
+                elif not result:
+                    # Errors before the request was sent and server errors may clear up; rejections will not
+                    transient = result.status_code is None or result.status_code >= 500
+                    self._finish_attempt(call, "error", retry=transient, error=result.error)
+                    return
+                else:
+                    call["sid"] = result.sid
+                    self.store.update_scheduled_call(call["id"], status=DIALING, sid=call["sid"])
+            outcome = self._wait_for_outcome(call)
+            if outcome is not None:
+                self._finish_attempt(call, outcome, retry=outcome in RETRY_OUTCOMES)
+        except Exception as e:
+            print(f"Error running scheduled call {call['id']}: {str(e)}")
+            # Keep a known SID to poll; without one the call may still have been placed
+            self._requeue(call, DIALING if call["sid"] else UNKNOWN, "error")
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _status_callback(self, call):
+        """URL Twilio reports this attempt's SID to, tagged with the scheduled call and attempt"""
+        if not self.callback_base_url:
+            return None
+        return f"{self.callback_base_url}/calls/status?scheduled_call={call['id']}&attempt={call['attempts']}"
+
+    def _reconcile(self, call):
+        """Find the call an unanswered create request may have placed, and only redial if there is none.
+
+        Returns True when this attempt's call was identified (its SID is adopted
+        and polled as usual); otherwise the attempt is finished or re-queued and
+        False is returned. A call is only adopted on an exact status callback
+        match, or when it is the single unclaimed call to the number and no
+        other scheduled call to it is unresolved; anything else stays unknown.
+        """
+        dialed_at = call.get("dialed_at") or call["updated_at"]
+        result = self._client(call).find_calls(call["to_number"], call["from_number"], dialed_at - CLOCK_SKEW)
+        if not result:
+            self._unresolved(call, dialed_at, result.error)
+            return False
+        # Calls on any scheduled call or case history belong to other cases or earlier attempts
+        sids = [found_call.get("sid") for found_call in result.data["calls"]]
+        known = self.store.known_call_sids(sids)
+        candidates = [sid for sid in sids if sid and sid not in known]
+        if not candidates:
+            self._finish_attempt(call, "error", retry=True, error="Call was not placed")
+            return False
+        tagged = (self.store.get_scheduled_call(call["id"]) or {}).get("callback_sid")
+        if tagged in candidates:
+            sid = tagged
+        elif len(candidates) == 1 and not self.callback_base_url and not self._others_unresolved(call):
+            sid = candidates[0]
+        else:
+            # Could be another caller's call to the same number (or the callback is late); never guess
+            self._unresolved(call, dialed_at, f"{len(candidates)} unmatched call(s) to {call['to_number']}")
+            return False
+        call.update(status=DIALING, sid=sid)
+        self.store.update_scheduled_call(call["id"], status=DIALING, sid=sid)
+        return True
+
+    def _others_unresolved(self, call):
+        """Whether another scheduled call to the same number may have placed a call we cannot tell apart"""
+        return any(other["id"] != call["id"] and other["to_number"] == call["to_number"] and not other["sid"]
+                   for other in self.store.scheduled_calls((DIALING, UNKNOWN)))
+
+    def _unresolved(self, call, dialed_at, error):
+        if time.time() - dialed_at > self.status_timeout:
+            # Twilio could not tell us for too long; give up rather than risk a second call
+            self._finish_attempt(call, UNKNOWN, error=error)
+        else:
+            self._requeue(call, UNKNOWN, UNKNOWN)
+
+    def _wait_for_outcome(self, call):
+        """Poll the call until it ends; None if the scheduler stopped first"""
+        client = self._client(call)
+        deadline = time.monotonic() + self.status_timeout
+        while time.monotonic() < deadline:
+            result = client.get_call(call["sid"])
+            if result and result.status in FINAL_CALL_STATUSES:
+                return result.status
+            if self._stop.wait(self.poll_interval):
+                return None
+        return "timeout"
+
+    def _finish_attempt(self, call, outcome, retry=False, error=None):
+        SCHEDULED_CALL_OUTCOMES.inc(outcome=outcome)
+        detail = {"attempt": call["attempts"], "scheduled_call_id": call["id"]}
+        if error:
+            detail["error"] = error
+        if call["case_id"]:
+            self.store.add_call(call["case_id"], outcome, sid=call["sid"], **detail)
+
+        if retry and call["attempts"] < call["max_attempts"]:
+            self._requeue(call, PENDING, outcome)
+            return
+        status = COMPLETED if outcome == "completed" else FAILED
+        self.store.update_scheduled_call(call["id"], status=status, last_outcome=outcome,
+                                         attempts=call["attempts"])
+
+    def _requeue(self, call, status, outcome):
+        """Put a call back in the queue after a backoff; only pending calls are dialed again"""
+        sid = call["sid"] if status == DIALING else None
+        call.update(
+            status=status, sid=sid, last_outcome=outcome,
+            not_before=time.time() + self.retry_backoff * 2 ** max(call["attempts"] - 1, 0)
+        )
+        self.store.update_scheduled_call(call["id"], status=status, sid=sid, last_outcome=outcome,
+                                         attempts=call["attempts"], not_before=call["not_before"])
+        with self._cond:
+            self._push(call)
+
+
+def get_call_scheduler(**kwargs):
+    """Build a scheduler configured from the environment (overridable by kwargs)"""
+    options = {
+        "rate": float(os.getenv("CALLS_PER_SECOND", 1.0)),
+        "burst": int(os.getenv("CALL_BURST", 1)),
+        "max_concurrent": int(os.getenv("MAX_CONCURRENT_CALLS", 4)),
+        "retry_backoff": float(os.getenv("CALL_RETRY_BACKOFF", 60)),
+        "poll_interval": float(os.getenv("CALL_POLL_INTERVAL", 5)),
+        "status_timeout": float(os.getenv("CALL_STATUS_TIMEOUT", 600)),
+        # Public URL of this app, where Twilio posts status callbacks
+        "callback_base_url": os.getenv("TWIML_BASE_URL")
+    }
+    options.update(kwargs)
+    scheduler = CallScheduler(**options)
+    register_callback(
+        "dispute_scheduled_calls", "Scheduled calls by queue state",
+        lambda: {key: value for key, value in scheduler.stats().items() if key != "by_status"},
+        labelname="state"
+    )
+    return scheduler
+
+
+def run_demo(cases=12, rate=5.0, max_concurrent=3):
+    """Run a small campaign against a local fake Twilio with busy and no-answer outcomes"""
+    import tempfile
+
+    from case_store import CaseStore
+    from fake_twilio import FakeTwilio
+
+    # "lost" places the call but drops the response; "dropped" drops the request before placing it
+    outcomes = {"+15550000001": ["busy", "completed"], "+15550000002": ["no-answer", "no-answer", "no-answer"],
+                "+15550000003": ["invalid"], "+15550000004": ["lost"], "+15550000005": ["dropped", "completed"]}
+    with tempfile.TemporaryDirectory() as tmp_dir, FakeTwilio(outcomes, ring_time=0.05) as twilio:
+        store = CaseStore(os.path.join(tmp_dir, "cases.db"))
+        scheduler = CallScheduler(
+            store, accounts={"AC" + "0" * 32: "token"}, rate=rate, burst=1, max_concurrent=max_concurrent,
+            retry_backoff=0.1, poll_interval=0.02, status_timeout=5, base_url=twilio.base_url
+        )
+        for i in range(cases):
+            case_id = store.save_case({"personal": {"first_name": f"Case{i}"}})
+            scheduler.enqueue(case_id, f"+1555000{i:04d}", "+15559999999", script="Follow-up call",
+                              priority=i % 3)
+        start = time.monotonic()
+        stats = scheduler.run_until_idle(timeout=60)
+        elapsed = time.monotonic() - start
+        created = [t for t, _, _ in twilio.requests]
+        span = created[-1] - created[0] if len(created) > 1 else 0
+        print(f"\n{len(created)} call requests in {elapsed:.2f}s "
+              f"({(len(created) - 1) / span if span else 0:.2f}/s, limit {rate}/s), "
+              f"max concurrent {twilio.max_active} (cap {max_concurrent})")
+        print(f"Final status: {stats['by_status']}")
+        for call in store.scheduled_calls():
+            if call["attempts"] > 1 or call["status"] != COMPLETED:
+                history = [entry["status"] for entry in store.call_history(call["case_id"])]
+                print(f"  {call['to_number']}: {call['status']} after {call['attempts']} attempt(s) {history}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Schedule and run outbound follow-up calls")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    enqueue = subparsers.add_parser("enqueue", help="Queue follow-up calls for stored cases")
+    enqueue.add_argument("--category", help="Only cases in this dispute category")
+    enqueue.add_argument("--max-confidence", type=float)
+    enqueue.add_argument("--days", type=float, help="Only cases created in the last N days")
+    enqueue.add_argument("--to", help="Call this number instead of each case's contact phone")
+    enqueue.add_argument("--priority", type=int, default=0)
+    enqueue.add_argument("--max-attempts", type=int, default=3)
+    enqueue.add_argument("--limit", type=int)
+    run = subparsers.add_parser("run", help="Dial queued calls until the queue is empty")
+    run.add_argument("--timeout", type=float, help="Stop after this many seconds")
+    subparsers.add_parser("status", help="Show queued calls by status")
+    subparsers.add_parser("demo", help="Run a sample campaign against a local fake Twilio")
+    args = parser.parse_args()
+
+    if args.command == "demo":
+        run_demo()
+    elif args.command == "status":
+        print(get_case_store().scheduled_call_counts())
+    elif args.command == "run":
+        print(get_call_scheduler().run_until_idle(args.timeout))
+    else:
+        scheduler = get_call_scheduler()
+        since = time.time() - args.days * 86400 if args.days else None
+        queued = 0
+        for case in scheduler.store.query(category=args.category, max_confidence=args.max_confidence,
+                                          since=since, limit=args.limit):
+            if scheduler.enqueue_case(case, args.to, priority=args.priority, max_attempts=args.max_attempts):
+                queued += 1
+        print(f"Queued {queued} call(s)")
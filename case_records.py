@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""Compact in-memory case records and a streaming binary format for them.
+
+CaseRecord and its parts use __slots__ and interned category, template and
+status names, so large batches of cases take a fraction of the memory of the
+equivalent dicts. from_dict/to_dict round-trip the JSON shape written to
+complete_analysis.json exactly, including keys this module does not know.
+
+The binary format is a magic header followed by length-prefixed frames, one
+per case, each a single marshal value so it decodes in one C call. Names that
+repeat across cases (categories, templates, statuses, category lists) are
+written once per stream and referenced by index afterwards, so frames must be
+read in order from the start of the stream.
+
+    python case_records.py --benchmark 50000
+"""
+
+import io
+import marshal
+import operator
+import struct
+import sys
+
+MAGIC = b"DCR1"
+
+
+class _Missing:
+    """Marks a field whose key was absent from the source dict"""
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+# Category name lists are identical for almost every case, so share one tuple per list
+_name_tuples = {}
+
+
+def intern_names(names):
+    """Return a shared tuple of interned names"""
+    names = tuple(names)
+    shared = _name_tuples.get(names)
+    if shared is None:
+        shared = _name_tuples[names] = tuple(sys.intern(name) for name in names)
+    return shared
+
+
+def _make_assign(fields):
+    """Build assign(record, values), storing a tuple into the named slots in one statement.
+
+    Generated like dataclasses' __init__: a single unpack into attributes is
+    several times faster than a setattr call per field.
+    """
+    targets = "".join(f"record.{field}, " for field in fields)
+    namespace = {}
+    exec(f"def assign(record, values):\n    {targets}= values\n", namespace)
+    return namespace["assign"]
+
+
+class _Record:
+    """Base for slotted records mapping to a fixed set of JSON keys"""
+
+    __slots__ = ("extra",)
+    FIELDS = ()
+    # Fields holding another record (or a list of them), by record class
+    NESTED = {}
+    # Fields holding a name from a small vocabulary, which are interned
+    SYMBOLS = ()
+    # Binary format layout: every slot in frame order, and (index, field, nested class
+    # or None for a symbol) for the fields that are not stored as-is
+    LAYOUT = ("extra",)
+    TYPED = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.LAYOUT = cls.FIELDS + ("extra",)
+        cls.TYPED = tuple((index, field, cls.NESTED.get(field)) for index, field in enumerate(cls.FIELDS)
+                          if field in cls.NESTED or field in cls.SYMBOLS)
+        cls._values = operator.attrgetter(*cls.LAYOUT)
+        cls._assign = staticmethod(_make_assign(cls.LAYOUT))
+
+    def __init__(self, **values):
+        for field in self.FIELDS:
+            value = values.pop(field, MISSING)
+            if field in self.SYMBOLS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, field, value)
+        # Unknown keys are kept as-is so to_dict stays lossless
+        self.extra = values or None
+
+    @classmethod
+    def from_dict(cls, data):
+        values = dict(data)
+        for field, record_class in cls.NESTED.items():
+            value = values.get(field)
+            if isinstance(value, dict):
+                values[field] = record_class.from_dict(value)
+            elif isinstance(value, list):
+                values[field] = [record_class.from_dict(item) if isinstance(item, dict) else item for item in value]
+        return cls(**values)
+
+    def to_dict(self):
+        data = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            if value is MISSING:
+                continue
+            if isinstance(value, (_Record, CategoryDetails)):
+                value = value.to_dict()
+            elif isinstance(value, list) and field in self.NESTED:
+                value = [item.to_dict() if isinstance(item, (_Record, CategoryDetails)) else item
+                         for item in value]
+            data[field] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        fields = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.FIELDS
+                           if getattr(self, field) is not MISSING)
+        return f"{type(self).__name__}({fields})"
+
+
+class PersonalInfo(_Record):
+    __slots__ = ("email", "first_name", "last_name", "ets_id")
+    FIELDS = __slots__
+
+
+class ContactInfo(_Record):
+    __slots__ = ("contact_email", "contact_phone")
+    FIELDS = __slots__
+
+
+class CategoryDetails:
+    """Keyword match count per category, as a shared name tuple plus a count tuple"""
+
+    __slots__ = ("names", "counts")
+
+    def __init__(self, names, counts):
+        self.names = intern_names(names)
+        self.counts = tuple(counts)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.keys(), data.values())
+
+    def to_dict(self):
+        return dict(zip(self.names, self.counts))
+
+    def __eq__(self, other):
+        return isinstance(other, CategoryDetails) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"CategoryDetails({self.to_dict()!r})"
+
+
+class DisputeAnalysis(_Record):
+    """process_dispute result"""
+
+    __slots__ = ("personal_info", "dispute_category", "confidence", "category_details", "suggested_template")
+    FIELDS = __slots__
+    NESTED = {"personal_info": PersonalInfo, "category_details": CategoryDetails}
+    SYMBOLS = ("dispute_category", "suggested_template")
+
+
+class CallRecord(_Record):
+    __slots__ = ("timestamp", "status", "type", "sid")
+    FIELDS = __slots__
+    SYMBOLS = ("status", "type")
+
+
+class CaseRecord(_Record):
+    """One case in the shape of complete_analysis.json"""
+
+    __slots__ = ("trace_id", "personal", "dispute", "contact", "call_history", "case_id")
+    FIELDS = __slots__
+    NESTED = {"personal": PersonalInfo, "dispute": DisputeAnalysis, "contact": ContactInfo,
+              "call_history": CallRecord}
+
+
+# Frames are marshal data of (new symbols, new category name lists, record tuple).
+# A record tuple holds its LAYOUT: each field in FIELDS order, then extra. Absent fields are
+# Ellipsis; symbol fields hold an index into the stream's symbols; nested fields
+# hold a record tuple, (name list index, counts) for CategoryDetails, or a list
+# of those. Any other value in a symbol or nested field is wrapped in a 1-tuple.
+_MARSHAL_VERSION = 4
+_FRAME_LENGTH = struct.Struct("<I")
+
+
+class RecordWriter:
+    """Streams CaseRecords (or case dicts) to a binary file object"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._symbols = {}
+        self._name_sets = {}
+        self._new_symbols = []
+        self._new_name_sets = []
+        self.count = 0
+        stream.write(MAGIC)
+
+    def write(self, record):
+        if isinstance(record, dict):
+            record = CaseRecord.from_dict(record)
+        values = self._encode(record)
+        payload = marshal.dumps((tuple(self._new_symbols), tuple(self._new_name_sets), values),
+                                _MARSHAL_VERSION)
+        self._new_symbols.clear()
+        self._new_name_sets.clear()
+        self.stream.write(_FRAME_LENGTH.pack(len(payload)))
+        self.stream.write(payload)
+        self.count += 1
+
+    def write_all(self, records):
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def _symbol(self, text):
+        index = self._symbols.get(text)
+        if index is None:
+            index = self._symbols[text] = len(self._symbols)
+            self._new_symbols.append(text)
+        return index
+
+    def _encode(self, record):
+        values = record._values(record)
+        if MISSING in values:
+            values = tuple(... if value is MISSING else value for value in values)
+        if not record.TYPED:
+            return values
+        values = list(values)
+        for index, _, nested in record.TYPED:
+            value = values[index]
+            if value is ... or value is None:
+                continue
+            if nested is None:
+                values[index] = self._symbol(value) if value.__class__ is str else (value,)
+            elif value.__class__ is list:
+                values[index] = [self._encode_nested(item) for item in value]
+            else:
+                values[index] = self._encode_nested(value)
+        return tuple(values)
+
+    def _encode_nested(self, value):
+        if isinstance(value, _Record):
+            return self._encode(value)
+        if isinstance(value, CategoryDetails):
+            index = self._name_sets.get(value.names)
+            if index is None:
+                index = self._name_sets[value.names] = len(self._name_sets)
+                self._new_name_sets.append(value.names)
+            return index, value.counts
+        return (value,)
+
+
+class RecordReader:
+    """Iterates over the CaseRecords of a binary stream written by RecordWriter.
+
+    Frames are decoded with marshal, which is not meant for untrusted input,
+    so only read streams this application wrote.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a case record stream")
+        self._symbols = []
+        self._name_sets = []
+
+    def __iter__(self):
+        read = self.stream.read
+        unpack = _FRAME_LENGTH.unpack
+        loads = marshal.loads
+        while True:
+            header = read(4)
+            if not header:
+                return
+            if len(header) < 4:
+                raise ValueError("Truncated case record stream")
+            length, = unpack(header)
+            payload = read(length)
+            if len(payload) < length:
+                raise ValueError("Truncated case record stream")
+            new_symbols, new_name_sets, values = loads(payload)
+            if new_symbols:
+                self._symbols.extend(sys.intern(symbol) for symbol in new_symbols)
+            if new_name_sets:
+                self._name_sets.extend(intern_names(names) for names in new_name_sets)
+            yield self._decode(CaseRecord, values)
+
+    def _decode(self, record_class, values):
+        record = record_class.__new__(record_class)
+        # Store every value at once, then fix up the few fields that are not stored as-is
+        record_class._assign(record, values)
+        if ... in values:
+            for field, value in zip(record_class.LAYOUT, values):
+                if value is ...:
+                    setattr(record, field, MISSING)
+        for index, field, nested in record_class.TYPED:
+            value = values[index]
+            kind = value.__class__
+            # Symbols are the only ints; a 1-tuple wraps a value stored as-is
+            if kind is int:
+                setattr(record, field, self._symbols[value])
+            elif kind is tuple:
+                setattr(record, field, self._decode_nested(nested, value))
+            elif kind is list:
+                setattr(record, field, [self._decode_nested(nested, item) for item in value])
+        return record
+
+    def _decode_nested(self, nested, value):
+        if len(value) == 1:
+            return value[0]
+        if nested is CategoryDetails:
+            details = CategoryDetails.__new__(CategoryDetails)
+            details.names = self._name_sets[value[0]]
+            details.counts = value[1]
+            return details
+        return self._decode(nested, value)
+
+
+def dump_records(records, path):
+    """Write case records (or case dicts) to a binary file; returns how many were written"""
+    with open(path, "wb") as f:
+        return RecordWriter(f).write_all(records)
+
+
+def load_records(path):
+    """Yield the case records stored in a binary file"""
+    with open(path, "rb") as f:
+        yield from RecordReader(f)
+
+
+def _synthetic_cases(count):
+    """Cases shaped like complete_analysis.json, built from the real pipeline on a few texts"""
+    import contextlib
+    import random
+
+    import dispute_assistant
+    from benchmark import DOCUMENT_KINDS, make_document_text
+
+    rng = random.Random(42)
+    with contextlib.redirect_stdout(io.StringIO()):
+        templates = []
+        for kind in DOCUMENT_KINDS:
+            text = make_document_text(kind, "short", rng)
+            templates.append({
+                "personal": dispute_assistant.extract_personal_info(text),
+                "dispute": dispute_assistant.process_dispute(text),
+                "contact": dispute_assistant.extract_contact_info(text)
+            })
+    cases = []
+    for i in range(count):
+        template = templates[i % len(templates)]
+        personal = dict(template["personal"], first_name=f"Name{i}", ets_id=f"{i:09d}")
+        dispute = dict(template["dispute"], personal_info=dict(personal),
+                       category_details=dict(template["dispute"]["category_details"]))
+        cases.append({
+            "trace_id": f"{rng.getrandbits(128):032x}",
+            "personal": personal,
+            "dispute": dispute,
+            "contact": dict(template["contact"]),
+            "call_history": [{"timestamp": "2024-05-01 10:00:00.000000", "status": "completed",
+                              "type": "automated_voice", "sid": f"CA{i:032x}"}],
+            "case_id": f"{rng.getrandbits(128):032x}"
+        })
+    return cases
+
+
+def benchmark(count=50000):
+    """Compare memory and serialization time of case dicts against CaseRecords"""
+    import gc
+    import json
+    import time
+    import tracemalloc
+
+    # Dicts as they come back from disk, so nothing is shared between cases
+    encoded = [json.dumps(case) for case in _synthetic_cases(count)]
+    results = {"cases": count}
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        built = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        return built, size
+
+    dicts, results["dict_bytes"] = measure(lambda: [json.loads(text) for text in encoded])
+    records, results["record_bytes"] = measure(lambda: [CaseRecord.from_dict(json.loads(text)) for text in encoded])
+
+    def timed_run(func, repeat=3):
+        # Best of a few runs, since collector pauses make single runs noisy
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            value = func()
+            timings.append(time.perf_counter() - start)
+        return value, round(min(timings) * 1000, 1)
+
+    def drain(items):
+        for _ in items:
+            pass
+
+    def read_binary():
+        buffer.seek(0)
+        return RecordReader(buffer)
+
+    json_pretty, results["json_indent_write_ms"] = timed_run(lambda: [json.dumps(case, indent=4) for case in dicts])
+    json_lines, results["jsonl_write_ms"] = timed_run(lambda: "\n".join(json.dumps(case) for case in dicts))
+    buffer = io.BytesIO()
+
+    def write_binary():
+        buffer.seek(0)
+        buffer.truncate()
+        RecordWriter(buffer).write_all(records)
+
+    _, results["binary_write_ms"] = timed_run(write_binary)
+    # Streaming: each case is handled and dropped, as when scanning an archive
+    _, results["jsonl_stream_read_ms"] = timed_run(lambda: drain(json.loads(line) for line in json_lines.split("\n")))
+    _, results["binary_stream_read_ms"] = timed_run(lambda: drain(read_binary()))
+    # Loading everything: records from JSON need from_dict on top of json.loads
+    _, results["jsonl_read_ms"] = timed_run(lambda: [json.loads(line) for line in json_lines.split("\n")])
+    _, results["jsonl_to_records_read_ms"] = timed_run(
+        lambda: [CaseRecord.from_dict(json.loads(line)) for line in json_lines.split("\n")])
+    decoded, results["binary_read_ms"] = timed_run(lambda: list(read_binary()))
+
+    results["json_indent_size"] = sum(len(text.encode("utf-8")) for text in json_pretty)
+    results["jsonl_size"] = len(json_lines.encode("utf-8"))
+    results["binary_size"] = len(buffer.getvalue())
+    results["round_trip_ok"] = all(record.to_dict() == case for record, case in zip(decoded, dicts))
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Convert or benchmark compact case records")
+    parser.add_argument("--benchmark", type=int, metavar="N", help="Compare dicts and records on N synthetic cases")
+    parser.add_argument("--pack", nargs=2, metavar=("JSONL", "OUTPUT"), help="Pack a JSON-lines file of cases")
+    parser.add_argument("--unpack", metavar="INPUT", help="Print the cases of a packed file as JSON lines")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        results = benchmark(args.benchmark)
+        print(json.dumps(results, indent=4))
+        print(f"\nMemory: {results['dict_bytes'] / results['record_bytes']:.1f}x smaller, "
+              f"size: {results['json_indent_size'] / results['binary_size']:.1f}x smaller than indented JSON")
+    elif args.pack:
+        with open(args.pack[0], "r", encoding="utf-8") as f:
+            written = dump_records((json.loads(line) for line in f if line.strip()), args.pack[1])
+        print(f"Packed {written} cases into {args.pack[1]}")
+    elif args.unpack:
+        for record in load_records(args.unpack):
+            print(json.dumps(record.to_dict()))
+    else:
+        parser.print_help()
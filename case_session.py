@@ -0,0 +1,67 @@
+import threading
+import time
+import uuid
+
+CREDENTIAL_FIELDS = ("account_sid", "auth_token", "from_number", "to_number")
+
+
+class CaseSession:
+    """One user's dispute case: in-memory uploads plus that user's own Twilio credentials"""
+
+    def __init__(self, credentials=None):
+        self.id = uuid.uuid4().hex
+        self.credentials = dict(credentials or {})
+        self.images = {}
+        # Perceptual hash per image type, and any earlier upload it duplicates
+        self.image_hashes = {}
+        self.duplicates = {}
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def add_image(self, image_type, data, image_hash=None, duplicate=None):
+        self.images[image_type] = data
+        self.image_hashes[image_type] = image_hash
+        self.duplicates[image_type] = duplicate
+        self.updated_at = time.time()
+
+    def has_images(self, *image_types):
+        return all(image_type in self.images for image_type in image_types)
+
+
+class CaseRegistry:
+    """Thread-safe map of live case sessions with idle expiry and a size cap"""
+
+    def __init__(self, ttl=1800, max_cases=1000):
+        self.ttl = ttl
+        self.max_cases = max_cases
+        self._cases = {}
+        self._lock = threading.Lock()
+
+    def create(self, credentials=None):
+        case = CaseSession(credentials)
+        with self._lock:
+            self._evict_locked()
+            if len(self._cases) >= self.max_cases:
+                # Drop the least recently touched case to bound memory
+                oldest = min(self._cases.values(), key=lambda c: c.updated_at)
+                del self._cases[oldest.id]
+            self._cases[case.id] = case
+        return case
+
+    def get(self, case_id):
+        with self._lock:
+            self._evict_locked()
+            return self._cases.get(case_id)
+
+    def discard(self, case_id):
+        with self._lock:
+            self._cases.pop(case_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cases)
+
+    def _evict_locked(self):
+        cutoff = time.time() - self.ttl
+        for case_id in [cid for cid, case in self._cases.items() if case.updated_at < cutoff]:
+            del self._cases[case_id]
@@ -0,0 +1,414 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cases.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cases (
+    case_id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    ets_id TEXT,
+    email TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    category TEXT,
+    confidence REAL,
+    suggested_template TEXT,
+    contact_email TEXT,
+    contact_phone TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cases_ets_id ON cases(ets_id);
+CREATE INDEX IF NOT EXISTS idx_cases_email ON cases(email);
+CREATE INDEX IF NOT EXISTS idx_cases_category ON cases(category, confidence);
+CREATE INDEX IF NOT EXISTS idx_cases_created_at ON cases(created_at);
+
+CREATE TABLE IF NOT EXISTS calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    case_id TEXT NOT NULL REFERENCES cases(case_id),
+    timestamp REAL NOT NULL,
+    status TEXT,
+    type TEXT,
+    sid TEXT,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_calls_case_id ON calls(case_id, timestamp);
+
+CREATE TABLE IF NOT EXISTS scheduled_calls (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    case_id TEXT REFERENCES cases(case_id),
+    account_sid TEXT,
+    to_number TEXT NOT NULL,
+    from_number TEXT,
+    script TEXT,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL,
+    sid TEXT,
+    last_outcome TEXT,
+    dialed_at REAL,
+    callback_sid TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_scheduled_calls_status ON scheduled_calls(status, priority, not_before);
+
+CREATE TABLE IF NOT EXISTS image_hashes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    namespace TEXT NOT NULL,
+    image_type TEXT NOT NULL,
+    image_hash TEXT NOT NULL,
+    thumbnail BLOB,
+    case_id TEXT,
+    text TEXT,
+    ocr_seconds REAL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS case_texts (
+    case_id TEXT PRIMARY KEY REFERENCES cases(case_id),
+    text TEXT NOT NULL
+);
+"""
+
+# Columns added to existing tables after their first release, as (table, column, type).
+# Old image_hashes rows have no content hash and are never reused.
+_ADDED_COLUMNS = (
+    ("image_hashes", "thumbnail", "BLOB"),
+    ("scheduled_calls", "dialed_at", "REAL"),
+    ("scheduled_calls", "callback_sid", "TEXT"),
+)
+
+
+def _to_epoch(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = datetime.datetime.combine(value, datetime.time())
+    return value.timestamp()
+
+
+class CaseStore:
+    """SQLite-backed case store with indexed columns and per-call history rows"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+            # Databases created before these columns existed
+            for table, column, column_type in _ADDED_COLUMNS:
+                columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _connect(self):
+        # sqlite3 connections cannot be shared across threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers and concurrent writers proceed without rewriting the file
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save_case(self, info, case_id=None, text=None):
+        """Insert or update a case built like the CLI's extracted_info; returns its case_id.
+
+        text is the OCR text the case was categorized from, kept so the case
+        can be re-scored when the category keywords change.
+        """
+        case_id = case_id or info.get("case_id") or uuid.uuid4().hex
+        personal = info.get("personal") or {}
+        dispute = info.get("dispute") or {}
+        contact = info.get("contact") or {}
+        data = {key: value for key, value in info.items() if key not in ("call_history", "case_id")}
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO cases (case_id, created_at, updated_at, ets_id, email, first_name, last_name,
+                                   category, confidence, suggested_template, contact_email, contact_phone, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(case_id) DO UPDATE SET
+                    updated_at = excluded.updated_at,
+                    ets_id = excluded.ets_id,
+                    email = excluded.email,
+                    first_name = excluded.first_name,
+                    last_name = excluded.last_name,
+                    category = excluded.category,
+                    confidence = excluded.confidence,
+                    suggested_template = excluded.suggested_template,
+                    contact_email = excluded.contact_email,
+                    contact_phone = excluded.contact_phone,
+                    data = excluded.data
+                """,
+                (
+                    case_id, now, now,
+                    personal.get("ets_id"), personal.get("email"),
+                    personal.get("first_name"), personal.get("last_name"),
+                    dispute.get("dispute_category"), dispute.get("confidence"),
+                    dispute.get("suggested_template"),
+                    contact.get("contact_email"), contact.get("contact_phone"),
+                    json.dumps(data)
+                )
+            )
+            if text is not None:
+                conn.execute(
+                    "INSERT INTO case_texts (case_id, text) VALUES (?, ?) "
+                    "ON CONFLICT(case_id) DO UPDATE SET text = excluded.text",
+                    (case_id, text)
+                )
+        return case_id
+
+    def add_call(self, case_id, status, call_type="automated_voice", sid=None, timestamp=None, **detail):
+        """Append one call attempt to a case's history"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO calls (case_id, timestamp, status, type, sid, detail) VALUES (?, ?, ?, ?, ?, ?)",
+                (case_id, _to_epoch(timestamp) or time.time(), status, call_type, sid,
+                 json.dumps(detail) if detail else None)
+            )
+
+    def call_history(self, case_id):
+        rows = self._connect().execute(
+            "SELECT timestamp, status, type, sid, detail FROM calls WHERE case_id = ? ORDER BY timestamp, id",
+            (case_id,)
+        )
+        history = []
+        for row in rows:
+            call = {
+                "timestamp": str(datetime.datetime.fromtimestamp(row["timestamp"])),
+                "status": row["status"],
+                "type": row["type"]
+            }
+            if row["sid"]:
+                call["sid"] = row["sid"]
+            if row["detail"]:
+                call.update(json.loads(row["detail"]))
+            history.append(call)
+        return history
+
+    def schedule_call(self, case_id, to_number, from_number=None, script=None, account_sid=None,
+                      priority=0, max_attempts=3, not_before=None, status="pending"):
+        """Add a call to the durable outbound queue; returns its id"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                """
+                INSERT INTO scheduled_calls (case_id, account_sid, to_number, from_number, script, priority,
+                                             status, max_attempts, not_before, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (case_id, account_sid, to_number, from_number, script, priority, status, max_attempts,
+                 _to_epoch(not_before) or now, now, now)
+            )
+        return cursor.lastrowid
+
+    def update_scheduled_call(self, call_id, **fields):
+        """Set columns of a scheduled call, e.g. status, attempts, sid, not_before"""
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE scheduled_calls SET {assignments} WHERE id = ?", (*fields.values(), call_id))
+
+    def get_scheduled_call(self, call_id):
+        row = self._connect().execute("SELECT * FROM scheduled_calls WHERE id = ?", (call_id,)).fetchone()
+        return dict(row) if row else None
+
+    def scheduled_calls(self, statuses=None):
+        """Return scheduled calls (optionally only those in statuses) as dicts, oldest first"""
+        sql = "SELECT * FROM scheduled_calls"
+        params = list(statuses or ())
+        if params:
+            sql += f" WHERE status IN ({', '.join('?' for _ in params)})"
+        sql += " ORDER BY id"
+        return [dict(row) for row in self._connect().execute(sql, params)]
+
+    def set_callback_sid(self, call_id, attempt, sid):
+        """Record the SID Twilio reported for one attempt of a scheduled call; False if it does not apply"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE scheduled_calls SET callback_sid = ?, updated_at = ? "
+                "WHERE id = ? AND attempts = ? AND status IN ('dialing', 'unknown')",
+                (sid, time.time(), call_id, attempt)
+            )
+        return cursor.rowcount > 0
+
+    def known_call_sids(self, sids):
+        """The subset of sids already tied to a scheduled call or a case's call history"""
+        sids = [sid for sid in sids if sid]
+        if not sids:
+            return set()
+        placeholders = ", ".join("?" for _ in sids)
+        rows = self._connect().execute(
+            f"SELECT sid FROM scheduled_calls WHERE sid IN ({placeholders}) "
+            f"UNION SELECT sid FROM calls WHERE sid IN ({placeholders})",
+            sids + sids
+        )
+        return {row["sid"] for row in rows}
+
+    def scheduled_call_counts(self):
+        rows = self._connect().execute("SELECT status, COUNT(*) FROM scheduled_calls GROUP BY status")
+        return {status: count for status, count in rows}
+
+    def get_case(self, case_id, with_calls=True):
+        """Return the stored case (plus its call history), or None"""
+        row = self._connect().execute("SELECT * FROM cases WHERE case_id = ?", (case_id,)).fetchone()
+        if row is None:
+            return None
+        return self._row_to_case(row, with_calls)
+
+    def _row_to_case(self, row, with_calls):
+        case = json.loads(row["data"])
+        case["case_id"] = row["case_id"]
+        case["created_at"] = row["created_at"]
+        if with_calls:
+            case["call_history"] = self.call_history(row["case_id"])
+        return case
+
+    def query(self, category=None, min_confidence=None, max_confidence=None, since=None, until=None,
+              ets_id=None, email=None, limit=None, with_calls=False):
+        """Yield matching cases, newest first, streaming rows from the database.
+
+        e.g. query(category="flight_claim", max_confidence=50,
+                   since=datetime.datetime.now() - datetime.timedelta(days=7))
+        """
+        clauses = []
+        params = []
+        for column, op, value in (
+            ("category", "=", category),
+            ("confidence", ">=", min_confidence),
+            ("confidence", "<", max_confidence),
+            ("created_at", ">=", _to_epoch(since)),
+            ("created_at", "<", _to_epoch(until)),
+            ("ets_id", "=", ets_id),
+            ("email", "=", email),
+        ):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value)
+        sql = "SELECT * FROM cases"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        for row in self._connect().execute(sql, params):
+            yield self._row_to_case(row, with_calls)
+
+    def add_image_hash(self, namespace, image_type, image_hash, thumbnail, case_id, text, ocr_seconds):
+        """Remember an uploaded image's perceptual hash, comparison thumbnail and OCR text; returns the row id"""
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO image_hashes (namespace, image_type, image_hash, thumbnail, case_id, text, "
+                "ocr_seconds, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                # Hashes are stored as hex since 64-bit values overflow SQLite integers
+                (namespace, image_type, format(image_hash, "x"), thumbnail, case_id, text, ocr_seconds,
+                 time.time())
+            )
+        return cursor.lastrowid
+
+    def iter_image_hashes(self):
+        """Yield (namespace, image_type, hash, (id, case_id, ocr_seconds)) for every stored hash"""
+        rows = self._connect().execute(
+            "SELECT id, namespace, image_type, image_hash, case_id, ocr_seconds FROM image_hashes ORDER BY id")
+        for row in rows:
+            yield row["namespace"], row["image_type"], int(row["image_hash"], 16), (
+                row["id"], row["case_id"], row["ocr_seconds"])
+
+    def get_image_entry(self, image_hash_id):
+        """(thumbnail, text) stored with an image hash row, or None"""
+        row = self._connect().execute(
+            "SELECT thumbnail, text FROM image_hashes WHERE id = ?", (image_hash_id,)).fetchone()
+        return (row["thumbnail"], row["text"]) if row else None
+
+    def iter_texts(self, category=None):
+        """Yield (case_id, text, category, confidence) for every case with stored text"""
+        sql = ("SELECT cases.case_id, case_texts.text, cases.category, cases.confidence "
+               "FROM cases JOIN case_texts ON case_texts.case_id = cases.case_id")
+        params = []
+        if category is not None:
+            sql += " WHERE cases.category = ?"
+            params.append(category)
+        for row in self._connect().execute(sql, params):
+            yield row["case_id"], row["text"], row["category"], row["confidence"]
+
+    def update_categories(self, results):
+        """Overwrite the dispute classification of many cases in one transaction.
+
+        results maps case_id to a categorize_dispute result.
+        """
+        conn = self._connect()
+        updates = []
+        for case_id, category in results.items():
+            row = conn.execute("SELECT data FROM cases WHERE case_id = ?", (case_id,)).fetchone()
+            if row is None:
+                continue
+            data = json.loads(row["data"])
+            dispute = data.setdefault("dispute", {})
+            dispute.update({
+                "dispute_category": category["primary_category"],
+                "confidence": category["confidence"],
+                "category_details": category["all_matches"],
+                "suggested_template": category["suggested_template"]
+            })
+            updates.append((category["primary_category"], category["confidence"],
+                            category["suggested_template"], time.time(), json.dumps(data), case_id))
+        with conn:
+            conn.executemany(
+                "UPDATE cases SET category = ?, confidence = ?, suggested_template = ?, updated_at = ?, data = ? "
+                "WHERE case_id = ?",
+                updates
+            )
+        return len(updates)
+
+    def count(self, category=None):
+        if category is None:
+            return self._connect().execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+        return self._connect().execute("SELECT COUNT(*) FROM cases WHERE category = ?", (category,)).fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_case_store():
+    """Return the process-wide case store, configured from CASE_DB_PATH"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CaseStore(os.getenv("CASE_DB_PATH", DEFAULT_DB_PATH))
+        return _store
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Query the dispute case store")
+    parser.add_argument("--category", help="Dispute category, e.g. flight_claim")
+    parser.add_argument("--min-confidence", type=float)
+    parser.add_argument("--max-confidence", type=float, help="Exclusive upper bound, in percent")
+    parser.add_argument("--days", type=float, help="Only cases created in the last N days")
+    parser.add_argument("--ets-id")
+    parser.add_argument("--email")
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else None
+    for case in get_case_store().query(
+        category=args.category, min_confidence=args.min_confidence, max_confidence=args.max_confidence,
+        since=since, ets_id=args.ets_id, email=args.email, limit=args.limit, with_calls=True
+    ):
+        print(json.dumps(case))
@@ -1,126 +1,286 @@
 #!/usr/bin/env python3
 
-import pytesseract
-from PIL import Image
-import re
+from startup import lazy_import, mark, print_startup_report
+import atexit
 import os
 import json
-from collections import Counter
-from twilio.rest import Client
-import datetime
-import subprocess
-from voice_generator import generate_twiml
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Get Twilio credentials
-TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-TWILIO_FROM_NUMBER = os.getenv('TWILIO_FROM_NUMBER')
-TWILIO_TO_NUMBER = os.getenv('TWILIO_TO_NUMBER')
-
-# Get personal information
-MY_FIRST_NAME = os.getenv('MY_FIRST_NAME')
-MY_LAST_NAME = os.getenv('MY_LAST_NAME')
-MY_ETS_ID = os.getenv('MY_ETS_ID')
-MY_EMAIL = os.getenv('MY_EMAIL')
-
-def extract_text_from_image(image_path):
-    """Extract text from image"""
+import functools
+import io
+import uuid
+from voice_generator import generate_twiml, publish_twiml
+from keyword_matcher import KeywordMatcher
+from ocr_cache import get_ocr_cache, make_cache_key
+from ocr_service import get_ocr_service, parse_tsv
+from field_extraction import scan_fields, first_candidate, best_candidate, has_phone_label
+from letter_templates import render_letter
+from case_store import get_case_store
+from metrics import (
+    timed, current_trace_id, new_trace_id, register_callback, STAGE_ERRORS, CALL_OUTCOMES, OCR_LADDER_FINISHED
+)
+
+# Configuration is read from the environment (and .env) on first use, not at import
+CONFIG_KEYS = (
+    # Twilio credentials
+    'TWILIO_ACCOUNT_SID', 'TWILIO_AUTH_TOKEN', 'TWILIO_FROM_NUMBER', 'TWILIO_TO_NUMBER',
+    # Personal information
+    'MY_FIRST_NAME', 'MY_LAST_NAME', 'MY_ETS_ID', 'MY_EMAIL'
+)
+
+@functools.lru_cache(maxsize=1)
+def load_environment():
+    """Load environment variables from .env, once"""
+    lazy_import("dotenv").load_dotenv()
+    mark("environment loaded")
+
+def get_config(name, default=None):
+    """Resolve a configuration value lazily"""
+    load_environment()
+    return os.getenv(name, default)
+
+def __getattr__(name):
+    # Keeps dispute_assistant.TWILIO_ACCOUNT_SID etc. working without eager lookups
+    if name in CONFIG_KEYS:
+        return get_config(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+@functools.lru_cache(maxsize=1)
+def get_tesseract_version():
+    """Tesseract version, looked up once per process"""
+    return str(lazy_import("pytesseract").get_tesseract_version())
+
+@functools.lru_cache(maxsize=1)
+def get_preprocessing_pipeline():
+    """Preprocessing pipeline configured from OCR_PREPROCESS"""
+    return lazy_import("image_preprocessing").PreprocessingPipeline.from_env()
+
+# OCR quality ladder, cheapest first: (name, preprocessing options or None for the configured
+# pipeline, extra Tesseract config). Later rungs only run when an earlier one is not good enough.
+OCR_LADDER = (
+    ("fast", {"steps": ("grayscale", "downscale", "crop"), "target_dpi": 150, "max_width": 1000},
+     "--psm 6 -c tessedit_do_invert=0"),
+    ("standard", None, ""),
+    ("thorough", {"steps": ("grayscale", "deskew", "binarize", "crop"), "max_width": 4000}, "--psm 3"),
+)
+
+# Info types the ladder knows how to judge
+LADDER_INFO_TYPES = ("personal", "contact")
+
+def ladder_required_fields(info_type, text):
+    """Fields a ladder pass must find before it stops, limited to those the document carries.
+
+    Name fields only exist on ETS forms, and a contact page only owes a phone
+    number when it has a phone label; other documents stop on a confident pass.
+    """
+    if info_type == "personal":
+        category = summarize_category_matches(_category_matcher.count(text))["primary_category"]
+        return ("first_name", "last_name") if category == "ets_refund" else ()
+    return ("contact_phone",) if has_phone_label(text) else ()
+
+@functools.lru_cache(maxsize=None)
+def get_ladder_pipeline(name):
+    """Preprocessing pipeline for one rung of the OCR ladder"""
+    options = next(options for rung, options, _ in OCR_LADDER if rung == name)
+    if options is None:
+        return get_preprocessing_pipeline()
+    return lazy_import("image_preprocessing").PreprocessingPipeline(**options)
+
+def read_image_bytes(image):
+    """Return the raw bytes of an image given as a path, bytes or file-like object"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if hasattr(image, "read"):
+        return image.read()
+    with open(image, "rb") as f:
+        return f.read()
+
+@timed("ocr")
+def extract_text_from_image(image, lang="eng", config="", use_cache=True, preprocess=True, info_type=None):
+    """Extract text from image (a path, raw bytes or a file-like object).
+
+    With info_type ("personal" or "contact") the image goes up the OCR quality
+    ladder instead of a single full pass; set OCR_LADDER=0 to disable.
+    """
     try:
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img)
+        load_environment()
+        image_bytes = read_image_bytes(image)
+        
+        pipeline = get_preprocessing_pipeline() if preprocess else None
+        ladder = preprocess and info_type in LADDER_INFO_TYPES and get_config("OCR_LADDER", "1") != "0"
+        
+        # Repeat uploads of the same image skip Tesseract entirely
+        cache = get_ocr_cache() if use_cache else None
+        if cache is not None:
+            signature = pipeline.signature() if pipeline else "none"
+            if ladder:
+                signature = f"ladder:{info_type}:{get_config('OCR_MIN_CONFIDENCE', 70)}:{signature}"
+            key = make_cache_key(image_bytes, get_tesseract_version(), lang, f"{config}|{signature}")
+            text = cache.get(key)
+            if text is not None:
+                return text
+        
+        img = lazy_import("PIL.Image").open(io.BytesIO(image_bytes))
+        if ladder:
+            text = run_ocr_ladder(img, info_type, lang, config)
+        else:
+            if pipeline:
+                with timed("preprocess"):
+                    img, _ = pipeline.run(img)
+            # Warm worker pool batches concurrent images into shared Tesseract runs
+            service = get_ocr_service()
+            with timed("tesseract"):
+                if service is not None:
+                    text = service.image_to_string(img, lang=lang, config=config)
+                else:
+                    text = lazy_import("pytesseract").image_to_string(img, lang=lang, config=config)
+        if cache is not None:
+            cache.put(key, text)
         return text
     except Exception as e:
+        STAGE_ERRORS.inc(stage="ocr")
         print(f"Error processing image: {str(e)}")
         return None
 
+def ocr_with_confidence(img, lang="eng", config=""):
+    """OCR a PIL image through image_to_data; returns (text, mean word confidence)"""
+    service = get_ocr_service()
+    with timed("tesseract"):
+        if service is not None:
+            tsv = service.image_to_data(img, lang=lang, config=config)
+        else:
+            tsv = lazy_import("pytesseract").image_to_data(img, lang=lang, config=config)
+    return parse_tsv(tsv)
+
+def run_ocr_ladder(img, info_type, lang="eng", config=""):
+    """OCR with the cheapest ladder rung that finds the required fields with enough confidence.
+
+    If no rung is good enough, the text from the rung that found all of its
+    required fields (then the most, then the highest confidence) is returned.
+    """
+    extract = extract_personal_info if info_type == "personal" else extract_contact_info
+    min_confidence = float(get_config("OCR_MIN_CONFIDENCE", 70))
+    best = None
+    for name, _, rung_config in OCR_LADDER:
+        with timed("preprocess"):
+            rung_img, _ = get_ladder_pipeline(name).run(img)
+        text, confidence = ocr_with_confidence(rung_img, lang, f"{config} {rung_config}".strip())
+        required = ladder_required_fields(info_type, text)
+        info = extract(text)
+        found = sum(1 for field in required if info.get(field))
+        score = (found == len(required), found, confidence)
+        if best is None or score > best[0]:
+            best = (score, text, name)
+        if found == len(required) and confidence >= min_confidence:
+            break
+    # Counted for the rung whose text is used, which is not always the last one tried
+    OCR_LADDER_FINISHED.inc(rung=best[2])
+    return best[1]
+
+def ocr_ladder_stats():
+    """How many images finished on each ladder rung, and the share done by the cheap pass"""
+    finished = {name: OCR_LADDER_FINISHED.value(rung=name) for name, _, _ in OCR_LADDER}
+    total = sum(finished.values())
+    return {
+        "images": total,
+        "finished_on": finished,
+        "cheap_pass_rate": round(finished[OCR_LADDER[0][0]] / total, 4) if total else 0
+    }
+
+@timed("extract_personal")
 def extract_personal_info(text):
     """Extract personal information"""
-    email = re.findall(r'[\w\.-]+@[\w\.-]+\.\w+', text)
-    first_name = re.findall(r'First\s*/\s*Given\s*Name\s*(\w+)', text)
-    last_name = re.findall(r'Last\s*/\s*Family\s*Name\s*(\w+)', text)
-    ets_id = re.findall(r'ETS\s*ID:\s*([A-Z0-9]+)', text)
+    # Shares one scan of the text with extract_contact_info
+    candidates = scan_fields(text)
     
     return {
-        "email": email[0] if email else None,
-        "first_name": first_name[0] if first_name else None,
-        "last_name": last_name[0] if last_name else None,
-        "ets_id": ets_id[0] if ets_id else None
+        "email": first_candidate(candidates, "email"),
+        "first_name": first_candidate(candidates, "first_name"),
+        "last_name": first_candidate(candidates, "last_name"),
+        "ets_id": first_candidate(candidates, "ets_id")
     }
 
+@timed("extract_contact")
 def extract_contact_info(text):
     """Extract contact information"""
-    # Extract email (support multiple formats)
-    email_patterns = [
-        r'[\w\.-]+@[\w\.-]+\.\w+',  # Basic email format
-        r'Contact:?\s*([\w\.-]+@[\w\.-]+\.\w+)',  # With Contact label
-        r'Email:?\s*([\w\.-]+@[\w\.-]+\.\w+)',    # With Email label
-        r'Support:?\s*([\w\.-]+@[\w\.-]+\.\w+)'   # With Support label
-    ]
-    
-    # Try all email patterns
-    email = None
-    for pattern in email_patterns:
-        matches = re.findall(pattern, text)
-        if matches:
-            email = matches[0]
-            break
+    # Labelled (Contact:/Email:/Support:/Phone:) candidates win over bare matches
+    candidates = scan_fields(text)
     
     # Add debug information
-    print(f"Debug: TWILIO_TO_NUMBER = {os.getenv('TWILIO_TO_NUMBER')}")
+    print(f"Debug: TWILIO_TO_NUMBER = {get_config('TWILIO_TO_NUMBER')}")
     
     return {
-        "contact_email": email,
-        "contact_phone": None  # Don't set phone number yet
+        "contact_email": best_candidate(candidates, "email"),
+        "contact_phone": best_candidate(candidates, "phone")
     }
 
+# Define keyword dictionary
+DISPUTE_CATEGORIES = {
+    "ets_refund": [
+        "refund", "test fee", "registration fee", "cancellation", "reschedule",
+        "toefl", "ets", "test center", "exam fee", "payment", "reimbursement",
+        "registration", "cancel", "postpone", "fee return"
+    ],
+    "ecommerce_refund": [
+        "amazon", "ebay", "walmart", "best buy", "order", "product",
+        "delivery", "item", "purchase", "return", "merchandise"
+    ],
+    "flight_claim": [
+        "flight", "airline", "united", "delta", "southwest", "expedia",
+        "ticket", "booking", "reservation", "delay", "cancellation", "travel"
+    ],
+    "credit_card": [
+        "credit card", "chase", "amex", "wells fargo", "capital one",
+        "transaction", "charge", "dispute", "unauthorized", "fraud"
+    ],
+    "shipping_claim": [
+        "fedex", "usps", "ups", "dhl", "package", "delivery",
+        "shipping", "lost", "damaged", "tracking", "parcel"
+    ],
+    "rideshare": [
+        "uber", "lyft", "turo", "hertz", "ride", "driver",
+        "trip", "car", "rental", "service", "pickup"
+    ],
+    "service_claim": [
+        "service", "provider", "appointment", "subscription",
+        "membership", "account", "access", "quality", "contract"
+    ]
+}
+
+# 根据类别选择模板
+TEMPLATE_MAPPING = {
+    "ets_refund": "ets_refund_template",
+    "ecommerce_refund": "ecommerce_refund_template",
+    "flight_claim": "flight_claim_template",
+    "credit_card": "credit_card_dispute_template",
+    "shipping_claim": "shipping_claim_template",
+    "rideshare": "rideshare_dispute_template",
+    "service_claim": "service_claim_template"
+}
+
+# Keyword automaton shared by every categorize_dispute call
+_category_matcher = KeywordMatcher()
+for _category, _keywords in DISPUTE_CATEGORIES.items():
+    _category_matcher.add(_category, _keywords)
+
+def register_category(category, keywords, template=None):
+    """Register (or extend) a dispute category at runtime"""
+    bucket = DISPUTE_CATEGORIES.setdefault(category, [])
+    bucket.extend(k for k in keywords if k not in bucket)
+    if template:
+        TEMPLATE_MAPPING[category] = template
+    _category_matcher.add(category, keywords)
+
+def match_category_keywords(text):
+    """Return {category: set of matched keywords} from one scan of the text"""
+    return _category_matcher.scan(text)
+
+@timed("categorize")
 def categorize_dispute(text):
     """Categorize dispute content"""
-    # Define keyword dictionary
-    categories = {
-        "ets_refund": [
-            "refund", "test fee", "registration fee", "cancellation", "reschedule",
-            "toefl", "ets", "test center", "exam fee", "payment", "reimbursement",
-            "registration", "cancel", "postpone", "fee return"
-        ],
-        "ecommerce_refund": [
-            "amazon", "ebay", "walmart", "best buy", "order", "product",
-            "delivery", "item", "purchase", "return", "merchandise"
-        ],
-        "flight_claim": [
-            "flight", "airline", "united", "delta", "southwest", "expedia",
-            "ticket", "booking", "reservation", "delay", "cancellation", "travel"
-        ],
-        "credit_card": [
-            "credit card", "chase", "amex", "wells fargo", "capital one",
-            "transaction", "charge", "dispute", "unauthorized", "fraud"
-        ],
-        "shipping_claim": [
-            "fedex", "usps", "ups", "dhl", "package", "delivery",
-            "shipping", "lost", "damaged", "tracking", "parcel"
-        ],
-        "rideshare": [
-            "uber", "lyft", "turo", "hertz", "ride", "driver",
-            "trip", "car", "rental", "service", "pickup"
-        ],
-        "service_claim": [
-            "service", "provider", "appointment", "subscription",
-            "membership", "account", "access", "quality", "contract"
-        ]
-    }
-    
-    # Convert text to lowercase for matching
-    text = text.lower()
-    
-    # Calculate matches for each category
-    matches = {}
-    for category, keywords in categories.items():
-        count = sum(1 for keyword in keywords if keyword in text)
-        matches[category] = count
-    
+    # Single pass over the lowercased text, keywords matched on word boundaries
+    return summarize_category_matches(_category_matcher.count(text))
+
+def summarize_category_matches(matches):
+    """Turn per-category keyword counts into the categorize_dispute result"""
     # Find the category with most matches
     if not any(matches.values()):
         return {
@@ -137,22 +297,11 @@ def categorize_dispute(text):
     # Calculate confidence
     confidence = (max_count / total_matches) if total_matches > 0 else 0
     
-    # 根据类别选择模板
-    template_mapping = {
-        "ets_refund": "ets_refund_template",
-        "ecommerce_refund": "ecommerce_refund_template",
-        "flight_claim": "flight_claim_template",
-        "credit_card": "credit_card_dispute_template",
-        "shipping_claim": "shipping_claim_template",
-        "rideshare": "rideshare_dispute_template",
-        "service_claim": "service_claim_template"
-    }
-    
     return {
         "primary_category": primary_category,
         "confidence": round(confidence * 100, 2),
         "all_matches": matches,
-        "suggested_template": template_mapping.get(primary_category, "general_dispute")
+        "suggested_template": TEMPLATE_MAPPING.get(primary_category, "general_dispute")
     }
 
 def process_dispute(text):
@@ -168,7 +317,8 @@ def process_dispute(text):
         "personal_info": info,
         "dispute_category": category_info["primary_category"],
         "confidence": category_info["confidence"],
-        "category_details": category_info["all_matches"]
+        "category_details": category_info["all_matches"],
+        "suggested_template": category_info["suggested_template"]
     }
     
     return result
@@ -182,17 +332,20 @@ def save_dispute_info(info, filename="dispute_info.json"):
     except Exception as e:
         print(f"Error saving information: {str(e)}")
 
-def process_image(image_path, info_type="personal"):
+@timed("process_image")
+def process_image(image, info_type="personal", name=None):
     """Process image and extract information"""
-    if not os.path.exists(image_path):
-        print(f"Error: Image file not found: {image_path}")
-        return
+    if isinstance(image, str):
+        if not os.path.exists(image):
+            print(f"Error: Image file not found: {image}")
+            return
+        name = name or os.path.basename(image)
         
-    text = extract_text_from_image(image_path)
+    text = extract_text_from_image(image, info_type=info_type)
     if not text:
         return
     
-    print(f"\nProcessing image: {os.path.basename(image_path)}")
+    print(f"\nProcessing image: {name or '<upload>'}")
     print("\nOriginal text:")
     print(text)
     
@@ -203,7 +356,13 @@ def process_image(image_path, info_type="personal"):
         print("\nDispute classification result:")
         print(f"Primary category: {dispute_info['dispute_category']}")
         print(f"Confidence: {dispute_info['confidence']}%")
-        save_dispute_info(dispute_info)
+        case_id = get_case_store().save_case({
+            "personal": info,
+            "dispute": dispute_info,
+            # Outside a request or run there is no trace; give the case its own ID without starting one
+            "trace_id": current_trace_id() or uuid.uuid4().hex
+        }, text=text)
+        print(f"\nCase saved: {case_id}")
     else:
         info = extract_contact_info(text)
         print("\nExtracted contact information:")
@@ -211,92 +370,53 @@ def process_image(image_path, info_type="personal"):
     for key, value in info.items():
         if value:
             print(f"{key}: {value}")
+    
+    return info
 
 def generate_ets_dispute_template(info):
     """Generate ETS TOEFL Refund Dispute Template"""
-    personal = info.get("personal", {})
-    name = f"{personal.get('first_name', '')} {personal.get('last_name', '')}".strip()
-    ets_id = personal.get('ets_id', '')
-    email = personal.get('email', '')
-    
-    template = f"""
-Subject: TOEFL Test Fee Refund Request - ETS ID: {ets_id}
-
-Dear ETS Customer Service,
-
-I am writing to request a refund for my TOEFL test registration. Below are my details:
-
-Personal Information:
-- Full Name: {name}
-- ETS ID: {ets_id}
-- Email Address: {email}
-
-Reason for Refund Request:
-I am requesting a refund for my TOEFL test registration due to [specific reason]. I registered for the test on [test registration date] and paid [amount] USD for the test fee.
-
-Supporting Information:
-1. I have not taken the test yet
-2. The registration is still within the refund eligibility period
-3. I have all necessary documentation to support my refund request
+    return render_letter(info, "ets_refund_template")
 
-Actions Taken:
-1. I have reviewed the ETS refund policy
-2. I have gathered all required documentation
-3. I am making this request within the specified timeframe
+@timed("render_letter")
+def generate_dispute_letter(info):
+    """Generate the dispute letter suggested by the case's category"""
+    return render_letter(info)
 
-Request:
-I kindly request a full refund of my test registration fee to be processed according to ETS refund policies.
-
-Required Documents Attached:
-1. Test Registration Confirmation
-2. Payment Receipt
-3. [Any additional supporting documents]
-
-Please process my refund request and confirm receipt of this email. I can be reached at {email} for any additional information you may need.
-
-Thank you for your attention to this matter.
-
-Best regards,
-{name}
-ETS ID: {ets_id}
-"""
-    return template
-
-def make_phone_call(to_number=TWILIO_TO_NUMBER, from_number=TWILIO_FROM_NUMBER, script=None):
-    """Make phone call using curl command"""
+def make_phone_call(to_number=None, from_number=None, script=None,
+                    account_sid=None, auth_token=None, base_url=None, status_callback=None):
+    """Make phone call through the pooled Twilio client; status_callback is told the SID once it is created"""
     try:
-        # Build curl command
-        twiml = f'<Response><Say voice="alice" language="en-US">{script}</Say></Response>' if script else ''
-        
-        curl_command = [
-            'curl', '-X', 'POST',
-            f'https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}/Calls.json',
-            '--data-urlencode', f'To={to_number}',
-            '--data-urlencode', f'From={from_number}',
-            '--data-urlencode', f'Twiml={twiml}' if script else 'Url=http://demo.twilio.com/docs/voice.xml',
-            '-u', f'{TWILIO_ACCOUNT_SID}:{TWILIO_AUTH_TOKEN}'
-        ]
+        # Prefer sending a URL to the stored TwiML; inline it only when no public URL is configured
+        with timed("twiml"):
+            twiml_url = publish_twiml(script) if script else None
+            twiml = generate_twiml(script) if script and not twiml_url else None
         
-        # Print curl command (for debugging)
-        print("\nExecuting curl command:")
-        print(' '.join(curl_command))
+        client = lazy_import("twilio_client").get_call_client(
+            account_sid or get_config('TWILIO_ACCOUNT_SID'),
+            auth_token or get_config('TWILIO_AUTH_TOKEN'),
+            base_url
+        )
+        with timed("call"):
+            result = client.create_call(
+                to_number or get_config('TWILIO_TO_NUMBER'),
+                from_number or get_config('TWILIO_FROM_NUMBER'),
+                twiml=twiml,
+                url=twiml_url,
+                status_callback=status_callback,
+                status_callback_event="initiated" if status_callback else None
+            )
+        CALL_OUTCOMES.inc(outcome="initiated" if result else "unknown" if result.unknown else "failed")
         
-        # Execute command
-        result = subprocess.run(curl_command, capture_output=True, text=True)
-        
-        # Print complete response (for debugging)
-        print("\nAPI Response:")
-        print(f"stdout: {result.stdout}")
-        print(f"stderr: {result.stderr}")
-        
-        if result.returncode == 0:
-            print("\nPhone call initiated successfully")
-            return True
+        if result:
+            print(f"\nPhone call initiated successfully (sid: {result.sid}, status: {result.status})")
+        elif result.unknown:
+            print(f"Phone call may have been placed, not retrying: {result.error}")
         else:
-            print(f"Error making phone call: {result.stderr}")
-            return None
+            print(f"Error making phone call: {result.error}")
+        return result
             
     except Exception as e:
+        CALL_OUTCOMES.inc(outcome="error")
         print(f"Error making phone call: {str(e)}")
         return None
 
@@ -342,7 +462,19 @@ This is {name} with ETS ID {ets_id}.
     """
     return script
 
+register_callback(
+    "dispute_ocr_cache_lookups_total", "OCR cache lookups by result",
+    lambda: {"hit": get_ocr_cache().hits, "miss": get_ocr_cache().misses},
+    metric_type="counter", labelname="result"
+)
+
+mark("dispute_assistant imported")
+
 if __name__ == "__main__":
+    # Report startup cost and lazy loads on exit (also covers the early exit below)
+    if get_config('STARTUP_REPORT'):
+        atexit.register(print_startup_report, "dispute_assistant")
+    
     # Set directory paths
     script_dir = os.path.dirname(os.path.abspath(__file__))
     personal_dir = os.path.join(script_dir, "personal_info")
@@ -354,13 +486,14 @@ if __name__ == "__main__":
             os.makedirs(directory)
             print(f"Created directory: {directory}")
     
-    # Store extracted information
-    extracted_info = {}
+    # Store extracted information, tagged with a trace ID for this run
+    extracted_info = {"trace_id": new_trace_id()}
     
     # Process personal information image
     personal_image = os.path.join(personal_dir, "personal.png")
+    personal_text = None
     if os.path.exists(personal_image):
-        text = extract_text_from_image(personal_image)
+        text = personal_text = extract_text_from_image(personal_image, info_type="personal")
         if text:
             personal_info = extract_personal_info(text)
             dispute_info = process_dispute(text)
@@ -370,7 +503,7 @@ if __name__ == "__main__":
     # Process contact information image
     contact_image = os.path.join(contact_dir, "contact.png")
     if os.path.exists(contact_image):
-        text = extract_text_from_image(contact_image)
+        text = extract_text_from_image(contact_image, info_type="contact")
         if text:
             contact_info = extract_contact_info(text)
             extracted_info["contact"] = contact_info
@@ -387,6 +520,10 @@ if __name__ == "__main__":
         print("Error: No contact phone number found in the image")
         exit(1)
     
+    # Record the case in the indexed store
+    case_store = get_case_store()
+    case_id = case_store.save_case(extracted_info, text=personal_text)
+    
     # Print summary information
     print("\n" + "="*50)
     print("Information Extraction Summary")
@@ -414,21 +551,24 @@ if __name__ == "__main__":
                 print(f"{category}: {count} keyword matches")
     
     # Add template generation after printing summary information
-    if "dispute" in extracted_info and extracted_info["dispute"]["dispute_category"] == "ets_refund":
+    if "dispute" in extracted_info:
+        category = extracted_info["dispute"]["dispute_category"]
         print("\n" + "="*50)
-        print("ETS TOEFL Refund Dispute Template")
+        print(f"Dispute Letter ({extracted_info['dispute']['suggested_template']})")
         print("="*50)
-        template = generate_ets_dispute_template(extracted_info)
+        template = generate_dispute_letter(extracted_info)
         print(template)
         
         # Save template to file
+        template_file = "ets_dispute_template.txt" if category == "ets_refund" else f"{category}_dispute_template.txt"
         try:
-            with open("ets_dispute_template.txt", "w", encoding="utf-8") as f:
+            with open(template_file, "w", encoding="utf-8") as f:
                 f.write(template)
-            print("\nTemplate saved to ets_dispute_template.txt")
+            print(f"\nTemplate saved to {template_file}")
         except Exception as e:
             print(f"Error saving template: {str(e)}")
-        
+    
+    if "dispute" in extracted_info and extracted_info["dispute"]["dispute_category"] == "ets_refund":
         # Ask if user wants to make a phone call
         print("\n" + "="*50)
         print("Phone Call Option")
@@ -447,21 +587,25 @@ if __name__ == "__main__":
                 
                 print("\nStarting phone call...")
                 call_success = make_phone_call(
-                    to_number=os.getenv('TWILIO_TO_NUMBER'),  # Use user-provided number
-                    from_number=os.getenv('TWILIO_FROM_NUMBER'),  # Use user's Twilio number
+                    to_number=get_config('TWILIO_TO_NUMBER'),  # Use user-provided number
+                    from_number=get_config('TWILIO_FROM_NUMBER'),  # Use user's Twilio number
                     script=voice_script
                 )
                 
+                # Save call history as its own row
+                case_store.add_call(
+                    case_id,
+                    "completed" if call_success else "failed",
+                    sid=call_success.sid if call_success else None
+                )
                 if call_success:
                     print("Phone connected, waiting for automated voice announcement")
-                    
-                    # Save call history
-                    extracted_info["call_history"] = {
-                        "timestamp": str(datetime.datetime.now()),
-                        "status": "completed",
-                        "type": "automated_voice"
-                    }
-                    save_dispute_info(extracted_info, "complete_analysis.json")
+                extracted_info["call_history"] = case_store.call_history(case_id)
+    
+    # Export complete information to file once
+    extracted_info["case_id"] = case_id
+    save_dispute_info(extracted_info, "complete_analysis.json")
     
-    # Save complete information to file
-    save_dispute_info(extracted_info, "complete_analysis.json")
\ No newline at end of file
+    cache_stats = get_ocr_cache().stats()
+    print(f"\nOCR cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+
@@ -0,0 +1,168 @@
+"""Local stand-in for the Twilio Calls API, for offline runs of the call paths.
+
+Calls are created by POST .../Calls.json and report their outcome on
+GET .../Calls/<sid>.json once ring_time has passed; GET .../Calls.json lists
+them, filtered by To and From. Outcomes are scripted per destination number,
+e.g. {"+15550001": ["busy", "completed"]} makes the first call to that
+number busy and the second one complete. "lost" places a call that completes
+but drops the connection instead of answering the create request, and
+"dropped" drops it without placing a call. A StatusCallback with the
+"initiated" event is posted the call's SID as soon as it is placed.
+"""
+
+import json
+import re
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+_CALLS_PATH = re.compile(r"^/2010-04-01/Accounts/(?P<account>[^/]+)/Calls(?:/(?P<sid>[^/]+))?\.json$")
+
+# Outcomes that make the create request itself fail instead of producing a call
+CREATE_ERRORS = {"error": 500, "invalid": 400}
+# Outcomes where the create request gets no response at all
+LOST = "lost"
+DROPPED = "dropped"
+
+
+class FakeTwilio:
+    """Threaded HTTP server that records calls and plays back scripted outcomes"""
+
+    def __init__(self, outcomes=None, default_outcome="completed", ring_time=0.0):
+        self.outcomes = {number: deque(script) for number, script in (outcomes or {}).items()}
+        self.default_outcome = default_outcome
+        self.ring_time = ring_time
+        self.calls = {}
+        self.requests = []
+        self.max_active = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def active_calls(self):
+        """Calls created whose outcome has not been fetched yet"""
+        return sum(1 for call in self.calls.values() if not call["reported"])
+
+    def create(self, account, form):
+        to_number = form.get("To", "")
+        with self._lock:
+            self.requests.append((time.monotonic(), account, to_number))
+            script = self.outcomes.get(to_number)
+            outcome = script.popleft() if script else self.default_outcome
+            if outcome in CREATE_ERRORS:
+                return CREATE_ERRORS[outcome], {"message": f"Scripted {outcome} for {to_number}"}
+            if outcome == DROPPED:
+                return None, None
+            sid = "CA" + uuid.uuid4().hex
+            self.calls[sid] = {
+                "sid": sid, "account": account, "to": to_number, "from": form.get("From"),
+                "outcome": "completed" if outcome == LOST else outcome, "created": time.monotonic(),
+                "date_created": formatdate(usegmt=True), "reported": False
+            }
+            self.max_active = max(self.max_active, self.active_calls())
+        if form.get("StatusCallback") and "initiated" in form.get("StatusCallbackEvent", "").split():
+            threading.Thread(target=_post_status, daemon=True, args=(form["StatusCallback"], {
+                "CallSid": sid, "CallStatus": "initiated", "AccountSid": account,
+                "To": to_number, "From": form.get("From", "")
+            })).start()
+        if outcome == LOST:
+            return None, None
+        return 201, {"sid": sid, "status": "queued", "to": to_number, "from": form.get("From")}
+
+    def list(self, account, query):
+        """Calls of an account, newest first, filtered by the To and From parameters"""
+        with self._lock:
+            calls = [
+                {"sid": call["sid"], "to": call["to"], "from": call["from"], "date_created": call["date_created"],
+                 "status": call["outcome"] if call["reported"] else "queued"}
+                for call in self.calls.values()
+                if call["account"] == account
+                and call["to"] == query.get("To", call["to"]) and call["from"] == query.get("From", call["from"])
+            ]
+        return 200, {"calls": calls[::-1]}
+
+    def fetch(self, sid):
+        with self._lock:
+            call = self.calls.get(sid)
+            if call is None:
+                return 404, {"message": f"Call {sid} not found"}
+            if time.monotonic() - call["created"] < self.ring_time:
+                return 200, {"sid": sid, "status": "ringing"}
+            call["reported"] = True
+            return 200, {"sid": sid, "status": call["outcome"]}
+
+
+def _post_status(url, fields):
+    try:
+        urllib.request.urlopen(url, urlencode(fields).encode("utf-8"), timeout=5).close()
+    except OSError:
+        pass
+
+
+def _make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Send headers and body in one segment so Nagle/delayed ACK don't dominate timings
+        wbufsize = 64 * 1024
+        disable_nagle_algorithm = True
+
+        def _route(self):
+            match = _CALLS_PATH.match(urlsplit(self.path).path)
+            if match is None:
+                self._reply(404, {"message": "Not found"})
+            return match
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+            match = self._route()
+            if match:
+                form = {key: values[0] for key, values in parse_qs(body).items()}
+                self._reply(*fake.create(match["account"], form))
+
+        def do_GET(self):
+            match = self._route()
+            if match and match["sid"]:
+                self._reply(*fake.fetch(match["sid"]))
+            elif match:
+                query = {key: values[0] for key, values in parse_qs(urlsplit(self.path).query).items()}
+                self._reply(*fake.list(match["account"], query))
+
+        def _reply(self, status, data):
+            if status is None:
+                # Scripted lost response: hang up without answering
+                self.close_connection = True
+                return
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
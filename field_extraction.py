@@ -0,0 +1,79 @@
+import functools
+import re
+from collections import namedtuple
+
+Candidate = namedtuple("Candidate", ["field", "value", "offset", "priority", "label"])
+
+_EMAIL = r'[\w\.-]+@[\w\.-]+\.\w+'
+_PHONE = r'(?:\+?1[\s.-]?)?(?:\(\d{3}\)\s?|\d{3}[\s.-])\d{3}[\s.-]\d{4}|\+\d{10,14}'
+
+# Each alternative is (group name, field, priority, pattern). The value is always in
+# the named group; labelled alternatives come first so they win at the same offset.
+_ALTERNATIVES = [
+    ("labelled_email", "email", 2,
+     r'(?P<labelled_email_label>Contact|Email|Support):?\s*(?P<labelled_email>' + _EMAIL + r')'),
+    ("labelled_phone", "phone", 2,
+     r'(?P<labelled_phone_label>Phone|Tel|Telephone|Call|Contact|Support|Toll[\s-]?free)'
+     r'[^\n\d+(]{0,20}(?P<labelled_phone>' + _PHONE + r'|\+?\d[\d ().-]{8,16}\d)'),
+    ("first_name", "first_name", 1, r'First\s*/\s*Given\s*Name\s*(?P<first_name>\w+)'),
+    ("last_name", "last_name", 1, r'Last\s*/\s*Family\s*Name\s*(?P<last_name>\w+)'),
+    ("ets_id", "ets_id", 1, r'ETS\s*ID:\s*(?P<ets_id>[A-Z0-9]+)'),
+    ("email", "email", 1, r'(?P<email>' + _EMAIL + r')'),
+    ("phone", "phone", 1, r'(?<![\w+])(?P<phone>' + _PHONE + r')(?!\w)'),
+]
+
+FIELD_PATTERN = re.compile("|".join(f"(?:{pattern})" for _, _, _, pattern in _ALTERNATIVES))
+
+_GROUP_INFO = {group: (field, priority) for group, field, priority, _ in _ALTERNATIVES}
+
+# Labels that announce a phone number, whether or not the number itself was read
+_PHONE_LABEL = re.compile(r'\b(?:Phone|Tel|Telephone|Toll[\s-]?free)\b', re.IGNORECASE)
+
+
+def normalize_phone(number):
+    """Reduce a phone number to E.164 style (+<digits>), assuming North America for 10 digits"""
+    digits = re.sub(r'\D', '', number)
+    if number.strip().startswith('+'):
+        return '+' + digits
+    if len(digits) == 10:
+        return '+1' + digits
+    if len(digits) == 11 and digits.startswith('1'):
+        return '+' + digits
+    return digits
+
+
+@functools.lru_cache(maxsize=32)
+def scan_fields(text):
+    """Scan text once and return every field candidate in offset order"""
+    candidates = []
+    for match in FIELD_PATTERN.finditer(text):
+        group = match.lastgroup
+        field, priority = _GROUP_INFO[group]
+        value = match.group(group)
+        label = match.group(f"{group}_label") if priority > 1 and field in ("email", "phone") else None
+        if field == "phone":
+            value = normalize_phone(value)
+        candidates.append(Candidate(field, value, match.start(group), priority, label))
+    return tuple(candidates)
+
+
+def has_phone_label(text):
+    """True when text labels a phone number, so one should be found in it"""
+    return _PHONE_LABEL.search(text) is not None
+
+
+def first_candidate(candidates, field):
+    """Earliest candidate for field, regardless of label"""
+    for candidate in candidates:
+        if candidate.field == field:
+            return candidate.value
+    return None
+
+
+def best_candidate(candidates, field):
+    """Highest priority candidate for field, earliest offset on ties"""
+    best = None
+    for candidate in candidates:
+        if candidate.field == field and (best is None or candidate.priority > best.priority):
+            best = candidate
+    return best.value if best else None
@@ -0,0 +1,232 @@
+import io
+import os
+import struct
+import threading
+import zlib
+
+from startup import lazy_import
+
+# Copies of one screenshot (recompressed, rescaled, re-cropped) differ by up
+# to about 110 in these thumbnails; forms with one character changed, 160+
+THUMBNAIL_WIDTH = 768
+MAX_THUMBNAIL_DIFFERENCE = 136
+
+
+def dhash(image, hash_size=8, thumbnail=512):
+    """Difference hash of an image (bytes or PIL image) as a hash_size**2-bit int.
+
+    Computed on a small whitespace-cropped thumbnail, so recompression, rescaling
+    and different margins or padding barely change it.
+    """
+    Image = lazy_import("PIL.Image")
+    # image_preprocessing imports PIL at the top, so it is only loaded once a hash is needed
+    from image_preprocessing import crop_whitespace
+    img = Image.open(io.BytesIO(image)) if isinstance(image, bytes) else image
+    # JPEGs can be decoded straight at reduced size
+    img.draft("L", (thumbnail, thumbnail))
+    img = img.convert("L")
+    img.thumbnail((thumbnail, thumbnail))
+    img = crop_whitespace(img, margin=0)
+    pixels = img.resize((hash_size + 1, hash_size), Image.LANCZOS).tobytes()
+    bits = 0
+    for y in range(hash_size):
+        row = pixels[y * (hash_size + 1):(y + 1) * (hash_size + 1)]
+        for x in range(hash_size):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+
+def thumbnail(image, width=THUMBNAIL_WIDTH):
+    """Whitespace-cropped grayscale thumbnail of an image (bytes or PIL image), for thumbnail_difference.
+
+    Returned as bytes: the width and height followed by the zlib-compressed
+    pixels. It is kept close to screenshot resolution, since a changed
+    character in a typed-in name must still show up in it.
+    """
+    Image = lazy_import("PIL.Image")
+    from image_preprocessing import crop_whitespace
+    # No draft() here: decoding JPEGs at reduced size shifts the crop against a PNG copy
+    img = Image.open(io.BytesIO(image)) if isinstance(image, bytes) else image
+    img = crop_whitespace(img.convert("L"), margin=0)
+    img = img.resize((width, max(1, round(width * img.height / img.width))), Image.BOX)
+    return struct.pack(">HH", *img.size) + zlib.compress(img.tobytes())
+
+
+def _thumbnail_image(data):
+    Image = lazy_import("PIL.Image")
+    ImageFilter = lazy_import("PIL.ImageFilter")
+    size = struct.unpack(">HH", data[:4])
+    # Blurred only here, since the sharp pixels compress to half the size;
+    # it smooths out resampling differences between rescaled copies
+    return Image.frombytes("L", size, zlib.decompress(data[4:])).filter(ImageFilter.GaussianBlur(0.75))
+
+
+def thumbnail_difference(a, b):
+    """Largest difference (0-255) between two thumbnails, tolerating a one pixel shift.
+
+    Each pixel is compared with the range of its 3x3 neighbourhood in the
+    other thumbnail, so slightly misaligned copies stay close. The maximum is
+    used rather than a mean, which a few changed characters barely move.
+    """
+    Image = lazy_import("PIL.Image")
+    ImageChops = lazy_import("PIL.ImageChops")
+    ImageFilter = lazy_import("PIL.ImageFilter")
+    a, b = _thumbnail_image(a), _thumbnail_image(b)
+    if abs(a.height - b.height) > max(2, a.height // 50):
+        # Different aspect ratio after cropping: different content
+        return 255
+    b = b.resize(a.size, Image.BOX)
+    difference = None
+    for one, other in ((a, b), (b, a)):
+        for outside in (ImageChops.subtract(one, other.filter(ImageFilter.MaxFilter(3))),
+                        ImageChops.subtract(other.filter(ImageFilter.MinFilter(3)), one)):
+            difference = outside if difference is None else ImageChops.lighter(difference, outside)
+    return difference.getextrema()[1]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class BKTree:
+    """Burkhard-Keller tree over Hamming distance for near-neighbour hash lookups"""
+
+    def __init__(self):
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, value):
+        self._size += 1
+        node = [key, value, {}]
+        if self._root is None:
+            self._root = node
+            return
+        current = self._root
+        while True:
+            distance = hamming(key, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, key, max_distance):
+        """Return (distance, key, value) for every entry within max_distance, nearest first"""
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node_key, value, children = stack.pop()
+            distance = hamming(key, node_key)
+            if distance <= max_distance:
+                found.append((distance, node_key, value))
+            # Triangle inequality: only subtrees at distance d +/- max_distance can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+class DuplicateIndex:
+    """Maps perceptual hashes of processed screenshots to their earlier OCR results.
+
+    A perceptual hash hit only picks candidates: forms that differ in nothing
+    but the typed-in name or ID hash a couple of bits apart. A candidate's
+    text is reused only when its thumbnail is within max_difference of the
+    upload's, which recompressed, re-cropped and rescaled copies are but a
+    form with other text typed in is not. Lookups are also scoped to a
+    namespace (the uploader's account) and an image type.
+
+    The tree holds hashes and case ids only. Thumbnails and OCR text are
+    fetched from the case store, or kept in memory when there is none.
+    """
+
+    def __init__(self, threshold=4, store=None, max_difference=MAX_THUMBNAIL_DIFFERENCE):
+        self.threshold = threshold
+        self.max_difference = max_difference
+        self.store = store
+        self._trees = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.unconfirmed = 0
+        self.ocr_seconds_avoided = 0.0
+        if store is not None:
+            for namespace, image_type, image_hash, entry in store.iter_image_hashes():
+                self._tree(namespace, image_type).add(image_hash, entry)
+
+    def _tree(self, namespace, image_type):
+        tree = self._trees.get((namespace, image_type))
+        if tree is None:
+            tree = self._trees[(namespace, image_type)] = BKTree()
+        return tree
+
+    def lookup(self, namespace, image_type, image_hash, image):
+        """Return the closest confirmed earlier result for image (with its distance and text), or None"""
+        with self._lock:
+            self.lookups += 1
+            matches = self._tree(namespace, image_type).search(image_hash, self.threshold)
+        if not matches:
+            return None
+        # Only build the thumbnail when there is a candidate to confirm
+        upload = thumbnail(image)
+        for distance, _, (entry_id, case_id, ocr_seconds) in matches:
+            entry = self.store.get_image_entry(entry_id) if self.store is not None else self._entries.get(entry_id)
+            if entry is None or entry[0] is None or entry[1] is None:
+                continue
+            if thumbnail_difference(upload, entry[0]) > self.max_difference:
+                continue
+            with self._lock:
+                self.hits += 1
+                self.ocr_seconds_avoided += ocr_seconds or 0
+            return {"case_id": case_id, "text": entry[1], "ocr_seconds": ocr_seconds, "distance": distance}
+        with self._lock:
+            self.unconfirmed += 1
+        return None
+
+    def add(self, namespace, image_type, image_hash, image, case_id, text, ocr_seconds):
+        thumb = thumbnail(image)
+        ocr_seconds = round(ocr_seconds, 4)
+        if self.store is not None:
+            entry_id = self.store.add_image_hash(namespace, image_type, image_hash, thumb, case_id, text, ocr_seconds)
+        with self._lock:
+            if self.store is None:
+                entry_id = len(self._entries)
+                self._entries[entry_id] = (thumb, text)
+            self._tree(namespace, image_type).add(image_hash, (entry_id, case_id, ocr_seconds))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": sum(len(tree) for tree in self._trees.values()),
+                "threshold": self.threshold,
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "unconfirmed": self.unconfirmed,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0,
+                "ocr_seconds_avoided": round(self.ocr_seconds_avoided, 3)
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_duplicate_index():
+    """Return the process-wide duplicate index, or None when DUPLICATE_THRESHOLD is negative"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            threshold = int(os.getenv("DUPLICATE_THRESHOLD", 4))
+            if threshold < 0:
+                return None
+            from case_store import get_case_store
+            max_difference = int(os.getenv("DUPLICATE_MAX_DIFFERENCE", MAX_THUMBNAIL_DIFFERENCE))
+            _index = DuplicateIndex(threshold, get_case_store(), max_difference)
+        return _index
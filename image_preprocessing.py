@@ -0,0 +1,210 @@
+import os
+import time
+
+from PIL import Image
+
+STEPS = ("grayscale", "downscale", "deskew", "binarize", "crop")
+
+# Binarization and deskew change what Tesseract sees the most, so they are opt-in
+DEFAULT_STEPS = ("grayscale", "downscale", "crop")
+
+
+def otsu_threshold(gray):
+    """Compute Otsu's threshold from the histogram of an 'L' image"""
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    if not total:
+        return 128
+    sum_all = sum(i * count for i, count in enumerate(histogram))
+    sum_bg = 0
+    weight_bg = 0
+    best_threshold = 0
+    best_variance = 0
+    for i, count in enumerate(histogram):
+        weight_bg += count
+        if not weight_bg:
+            continue
+        weight_fg = total - weight_bg
+        if not weight_fg:
+            break
+        sum_bg += i * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = i
+    return best_threshold
+
+
+def to_grayscale(img):
+    return img if img.mode == "L" else img.convert("L")
+
+
+def downscale(img, target_dpi=300, max_width=2000):
+    """Scale down to target_dpi when the DPI is known, otherwise to max_width; never upscale"""
+    scale = 1.0
+    dpi = img.info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > target_dpi:
+        scale = target_dpi / float(dpi[0])
+    elif max_width and img.width > max_width:
+        scale = max_width / float(img.width)
+    if scale >= 1.0:
+        return img
+    size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+    return img.resize(size, Image.LANCZOS)
+
+
+def binarize(img):
+    gray = to_grayscale(img)
+    threshold = otsu_threshold(gray)
+    return gray.point(lambda p: 255 if p > threshold else 0)
+
+
+def estimate_skew(img, max_angle=5.0, step=0.5):
+    """Find the rotation that maximizes the variance of row ink (projection profile)"""
+    thumb = to_grayscale(img).copy()
+    thumb.thumbnail((400, 400))
+    threshold = otsu_threshold(thumb)
+    ink = thumb.point(lambda p: 255 if p <= threshold else 0)
+
+    best_angle = 0.0
+    best_score = -1.0
+    angle = -max_angle
+    while angle <= max_angle + 1e-9:
+        rotated = ink.rotate(angle, resample=Image.BILINEAR, expand=True, fillcolor=0)
+        # Collapsing to one column gives the mean ink per row
+        rows = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+        mean = sum(rows) / len(rows)
+        score = sum((r - mean) ** 2 for r in rows)
+        if score > best_score:
+            best_score = score
+            best_angle = angle
+        angle += step
+    return best_angle
+
+
+def deskew(img, max_angle=5.0, step=0.5):
+    angle = estimate_skew(img, max_angle, step)
+    if not angle:
+        return img
+    fill = 255 if img.mode in ("L", "1") else (255,) * len(img.getbands())
+    return img.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+
+
+def crop_whitespace(img, threshold=200, margin=10):
+    """Crop away the near-white border around the content"""
+    gray = to_grayscale(img)
+    bbox = gray.point(lambda p: 255 if p < threshold else 0).getbbox()
+    if not bbox:
+        return img
+    left, top, right, bottom = bbox
+    bbox = (max(0, left - margin), max(0, top - margin),
+            min(img.width, right + margin), min(img.height, bottom + margin))
+    if bbox == (0, 0, img.width, img.height):
+        return img
+    return img.crop(bbox)
+
+
+class PreprocessingPipeline:
+    """Configurable, per-step timed image preprocessing in front of OCR"""
+
+    def __init__(self, steps=DEFAULT_STEPS, target_dpi=300, max_width=2000, crop_threshold=200):
+        unknown = set(steps) - set(STEPS)
+        if unknown:
+            raise ValueError(f"Unknown preprocessing steps: {', '.join(sorted(unknown))}")
+        # Always run in the canonical order, whatever order the caller listed
+        self.steps = tuple(step for step in STEPS if step in steps)
+        self.target_dpi = target_dpi
+        self.max_width = max_width
+        self.crop_threshold = crop_threshold
+
+    @classmethod
+    def from_env(cls):
+        """Build a pipeline from OCR_PREPROCESS (comma separated steps, or 'none')"""
+        value = os.getenv("OCR_PREPROCESS")
+        if value is None:
+            steps = DEFAULT_STEPS
+        elif value.strip().lower() in ("", "none", "off"):
+            steps = ()
+        else:
+            steps = tuple(step.strip() for step in value.split(",") if step.strip())
+        return cls(
+            steps=steps,
+            target_dpi=int(os.getenv("OCR_TARGET_DPI", 300)),
+            max_width=int(os.getenv("OCR_MAX_WIDTH", 2000))
+        )
+
+    def signature(self):
+        """Stable description of the configuration, used in OCR cache keys"""
+        if not self.steps:
+            return "none"
+        return f"{','.join(self.steps)};dpi={self.target_dpi};w={self.max_width};t={self.crop_threshold}"
+
+    def run(self, img):
+        """Apply the enabled steps; returns (image, {step: milliseconds})"""
+        timings = {}
+        for step in self.steps:
+            start = time.perf_counter()
+            if step == "grayscale":
+                img = to_grayscale(img)
+            elif step == "downscale":
+                img = downscale(img, self.target_dpi, self.max_width)
+            elif step == "deskew":
+                img = deskew(img)
+            elif step == "binarize":
+                img = binarize(img)
+            elif step == "crop":
+                img = crop_whitespace(img, self.crop_threshold)
+            timings[step] = round((time.perf_counter() - start) * 1000, 2)
+        return img, timings
+
+
+def measure_ocr_savings(image_path, pipeline=None, lang="eng", config=""):
+    """OCR an image with and without preprocessing and report time saved and field agreement"""
+    import pytesseract
+    from dispute_assistant import extract_personal_info
+
+    pipeline = pipeline or PreprocessingPipeline.from_env()
+    original = Image.open(image_path)
+    original.load()
+
+    start = time.perf_counter()
+    raw_text = pytesseract.image_to_string(original, lang=lang, config=config)
+    raw_ms = (time.perf_counter() - start) * 1000
+
+    processed, timings = pipeline.run(original)
+    start = time.perf_counter()
+    processed_text = pytesseract.image_to_string(processed, lang=lang, config=config)
+    processed_ms = (time.perf_counter() - start) * 1000
+    preprocess_ms = sum(timings.values())
+
+    raw_fields = extract_personal_info(raw_text)
+    processed_fields = extract_personal_info(processed_text)
+    lost_fields = [key for key, value in raw_fields.items()
+                   if value and processed_fields.get(key) != value]
+
+    return {
+        "image": image_path,
+        "original_size": list(original.size),
+        "processed_size": list(processed.size),
+        "steps": timings,
+        "preprocess_ms": round(preprocess_ms, 2),
+        "ocr_raw_ms": round(raw_ms, 2),
+        "ocr_processed_ms": round(processed_ms, 2),
+        "saved_ms": round(raw_ms - processed_ms - preprocess_ms, 2),
+        "fields_raw": raw_fields,
+        "fields_processed": processed_fields,
+        "lost_fields": lost_fields
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python image_preprocessing.py <image> [<image> ...]")
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        print(json.dumps(measure_ocr_savings(path), indent=4))
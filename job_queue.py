@@ -0,0 +1,187 @@
+import contextvars
+import queue
+import threading
+import time
+import uuid
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (COMPLETED, FAILED, CANCELLED)
+
+# Event published once a job reaches a finished state
+DONE_EVENT = "done"
+
+_current_job = contextvars.ContextVar("current_job", default=None)
+
+
+def publish(event, data=None):
+    """Record a progress event on the job running in this context; no-op outside a job"""
+    job = _current_job.get()
+    if job is not None:
+        job.publish(event, data)
+
+
+def check_cancelled():
+    """Stop the job running in this context if it was cancelled; call between stages"""
+    job = _current_job.get()
+    if job is not None and job.cancel_requested.is_set():
+        raise JobCancelled(f"Job {job.id} was cancelled")
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue is at its depth limit"""
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once its cancellation was requested"""
+
+
+class Job:
+    """A unit of background work and its status"""
+
+    def __init__(self, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = threading.Event()
+        # Run in the submitter's context so trace IDs follow the job onto the worker
+        self.context = contextvars.copy_context()
+        self.events = []
+        self._events_changed = threading.Condition()
+
+    def publish(self, event, data=None):
+        with self._events_changed:
+            self.events.append((event, data))
+            self._events_changed.notify_all()
+
+    def wait_for_events(self, after, timeout=None):
+        """Return events published after the first `after`, waiting up to timeout for one"""
+        with self._events_changed:
+            if len(self.events) <= after:
+                self._events_changed.wait(timeout)
+            return self.events[after:]
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class JobQueue:
+    """Bounded worker pool with job status tracking, cancellation and TTL eviction"""
+
+    def __init__(self, workers=2, max_queued=32, ttl=600):
+        self.workers = workers
+        self.ttl = ttl
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._started = False
+
+    def _ensure_started(self):
+        # Workers start on first submit so importing the app doesn't spawn threads
+        if self._started:
+            return
+        self._started = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args, **kwargs):
+        """Enqueue func(*args, **kwargs); raises QueueFullError when the queue is full"""
+        self.evict_expired()
+        job = Job(func, args, kwargs)
+        with self._lock:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                raise QueueFullError("Too many jobs queued, try again later")
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        self.evict_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a job; queued jobs never run, running jobs see job.cancel_requested"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status in FINISHED_STATES:
+                return job
+            job.cancel_requested.set()
+            if job.status == QUEUED:
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                job.publish(DONE_EVENT, job.to_dict())
+            return job
+
+    def depth(self):
+        """Number of jobs waiting for a worker"""
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {"queue_depth": self.depth(), "max_queued": self._queue.maxsize,
+                "workers": self.workers, "jobs": counts}
+
+    def evict_expired(self):
+        """Forget finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.status in FINISHED_STATES and job.finished_at < cutoff]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.status == CANCELLED:
+                        continue
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                job.publish("status", {"status": RUNNING})
+                try:
+                    job.context.run(_current_job.set, job)
+                    result = job.context.run(job.func, *job.args, **job.kwargs)
+                    status, error = COMPLETED, None
+                except JobCancelled:
+                    result, status, error = None, CANCELLED, None
+                except Exception as e:
+                    result, status, error = None, FAILED, str(e)
+                with self._lock:
+                    job.result = result
+                    job.error = error
+                    job.status = CANCELLED if job.cancel_requested.is_set() else status
+                    job.finished_at = time.time()
+                job.publish(DONE_EVENT, job.to_dict())
+            finally:
+                self._queue.task_done()
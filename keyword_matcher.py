@@ -0,0 +1,108 @@
+import re
+import threading
+from collections import deque
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def _is_word_char(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class KeywordMatcher:
+    """Word-boundary aware multi-keyword matcher (Aho-Corasick)"""
+
+    def __init__(self):
+        self._groups = {}
+        self._dirty = True
+        # (groups, goto, fail, output), replaced as a whole so concurrent scans see one consistent build
+        self._automaton = ((), [{}], [0], [[]])
+        self._lock = threading.Lock()
+
+    def add(self, group, keywords):
+        """Add keywords to a group; the automaton is rebuilt lazily on next scan"""
+        with self._lock:
+            bucket = self._groups.setdefault(group, [])
+            for keyword in keywords:
+                keyword = normalize(keyword)
+                if keyword and keyword not in bucket:
+                    bucket.append(keyword)
+            self._dirty = True
+
+    def groups(self):
+        """Return group names in registration order"""
+        return list(self._groups)
+
+    def keywords(self, group):
+        return list(self._groups.get(group, []))
+
+    def compile(self):
+        """Build the trie, failure links and output sets"""
+        with self._lock:
+            self._automaton = self._build()
+            self._dirty = False
+
+    def _build(self):
+        goto = [{}]
+        output = [[]]
+        for group, keywords in self._groups.items():
+            for keyword in keywords:
+                state = 0
+                for ch in keyword:
+                    nxt = goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(goto)
+                        goto[state][ch] = nxt
+                        goto.append({})
+                        output.append([])
+                    state = nxt
+                output[state].append((keyword, group))
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                output[nxt] = output[nxt] + output[fail[nxt]]
+
+        return tuple(self._groups), goto, fail, output
+
+    def scan(self, text):
+        """Scan text once and return {group: set of matched keywords}"""
+        if self._dirty:
+            self.compile()
+
+        groups, goto, fail, output = self._automaton
+        found = {group: set() for group in groups}
+        text = normalize(text)
+        length = len(text)
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not output[state]:
+                continue
+            # Only accept matches that sit on word boundaries
+            if i + 1 < length and _is_word_char(text[i + 1]):
+                continue
+            for keyword, group in output[state]:
+                start = i - len(keyword) + 1
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                found[group].add(keyword)
+        return found
+
+    def count(self, text):
+        """Return {group: number of distinct keywords matched}"""
+        return {group: len(hits) for group, hits in self.scan(text).items()}
+
+
+def normalize(text):
+    """Lowercase and collapse whitespace so multi-word keywords survive OCR line breaks"""
+    return _WHITESPACE.sub(' ', text.lower()).strip()
@@ -0,0 +1,432 @@
+import datetime
+import os
+import string
+import threading
+import time
+import zipfile
+from collections import Counter
+
+LETTER_TEMPLATES = {
+    "ets_refund_template": """
+Subject: TOEFL Test Fee Refund Request - ETS ID: {ets_id}
+
+Dear ETS Customer Service,
+
+I am writing to request a refund for my TOEFL test registration. Below are my details:
+
+Personal Information:
+- Full Name: {name}
+- ETS ID: {ets_id}
+- Email Address: {email}
+
+Reason for Refund Request:
+I am requesting a refund for my TOEFL test registration due to [specific reason]. I registered for the test on [test registration date] and paid [amount] USD for the test fee.
+
+Supporting Information:
+1. I have not taken the test yet
+2. The registration is still within the refund eligibility period
+3. I have all necessary documentation to support my refund request
+
+Actions Taken:
+1. I have reviewed the ETS refund policy
+2. I have gathered all required documentation
+3. I am making this request within the specified timeframe
+
+Request:
+I kindly request a full refund of my test registration fee to be processed according to ETS refund policies.
+
+Required Documents Attached:
+1. Test Registration Confirmation
+2. Payment Receipt
+3. [Any additional supporting documents]
+
+Please process my refund request and confirm receipt of this email. I can be reached at {email} for any additional information you may need.
+
+Thank you for your attention to this matter.
+
+Best regards,
+{name}
+ETS ID: {ets_id}
+""",
+    "ecommerce_refund_template": """
+Subject: Refund Request for Order [order number]
+
+Dear Customer Service,
+
+I am writing to request a refund for an order placed on [order date].
+
+Customer Information:
+- Full Name: {name}
+- Email Address: {email}
+
+Reason for Refund Request:
+The item [item name] was [not delivered / damaged / not as described]. I paid [amount] for this order.
+
+Request:
+I kindly request a full refund to my original payment method in accordance with your return and refund policy.
+
+Required Documents Attached:
+1. Order Confirmation
+2. Payment Receipt
+3. [Photos or delivery records]
+
+Please confirm receipt of this request. I can be reached at {email}.
+
+Best regards,
+{name}
+""",
+    "flight_claim_template": """
+Subject: Compensation Claim for Flight [flight number] on [flight date]
+
+Dear Customer Relations,
+
+I am writing to submit a claim regarding my flight [flight number] from [origin] to [destination].
+
+Passenger Information:
+- Full Name: {name}
+- Email Address: {email}
+- Booking Reference: [booking reference]
+
+Details of the Claim:
+The flight was [delayed / cancelled / overbooked], which caused [describe impact]. I paid [amount] for this ticket.
+
+Request:
+I kindly request a refund or compensation in accordance with your conditions of carriage and applicable passenger rights regulations.
+
+Required Documents Attached:
+1. Booking Confirmation
+2. Boarding Pass or E-ticket
+3. [Receipts for additional expenses]
+
+I can be reached at {email} for any additional information you may need.
+
+Best regards,
+{name}
+""",
+    "credit_card_dispute_template": """
+Subject: Dispute of Charge on Account Ending [last four digits]
+
+Dear Card Services,
+
+I am writing to dispute a charge on my credit card account.
+
+Cardholder Information:
+- Full Name: {name}
+- Email Address: {email}
+
+Disputed Transaction:
+- Merchant: [merchant name]
+- Transaction Date: [transaction date]
+- Amount: [amount]
+
+Reason for Dispute:
+The charge is [unauthorized / duplicated / for goods or services not received]. I have attempted to resolve this with the merchant without success.
+
+Request:
+I kindly request that you investigate this transaction and issue a credit for the disputed amount.
+
+Required Documents Attached:
+1. Account Statement
+2. [Correspondence with the merchant]
+
+I can be reached at {email} for any additional information you may need.
+
+Best regards,
+{name}
+""",
+    "shipping_claim_template": """
+Subject: Claim for Lost or Damaged Package - Tracking Number [tracking number]
+
+Dear Claims Department,
+
+I am writing to file a claim for a package shipped on [ship date].
+
+Claimant Information:
+- Full Name: {name}
+- Email Address: {email}
+
+Package Details:
+- Tracking Number: [tracking number]
+- Declared Value: [amount]
+
+Details of the Claim:
+The package was [lost / damaged / delivered to the wrong address].
+
+Request:
+I kindly request reimbursement for the declared value of the package and the shipping charges.
+
+Required Documents Attached:
+1. Shipping Receipt
+2. Proof of Value
+3. [Photos of the damage]
+
+I can be reached at {email} for any additional information you may need.
+
+Best regards,
+{name}
+""",
+    "rideshare_dispute_template": """
+Subject: Dispute of Charge for Trip on [trip date]
+
+Dear Support Team,
+
+I am writing to dispute a charge for a trip or rental on [trip date].
+
+Customer Information:
+- Full Name: {name}
+- Email Address: {email}
+
+Details of the Dispute:
+I was charged [amount] for [describe trip or rental]. The charge is incorrect because [specific reason].
+
+Request:
+I kindly request a refund of the incorrect charge.
+
+Required Documents Attached:
+1. Trip or Rental Receipt
+2. [Screenshots or photos]
+
+I can be reached at {email} for any additional information you may need.
+
+Best regards,
+{name}
+""",
+    "service_claim_template": """
+Subject: Refund Request for [service or subscription name]
+
+Dear Customer Service,
+
+I am writing to request a refund for [service or subscription name].
+
+Customer Information:
+- Full Name: {name}
+- Email Address: {email}
+
+Reason for Refund Request:
+The service was [not provided / cancelled / not as agreed]. I paid [amount] on [payment date].
+
+Request:
+I kindly request a refund in accordance with the terms of my agreement.
+
+Required Documents Attached:
+1. Contract or Subscription Confirmation
+2. Payment Receipt
+
+I can be reached at {email} for any additional information you may need.
+
+Best regards,
+{name}
+""",
+    "general_dispute": """
+Subject: Formal Dispute and Refund Request
+
+Dear Customer Service,
+
+I am writing to formally dispute [describe the charge or issue].
+
+Customer Information:
+- Full Name: {name}
+- Email Address: {email}
+
+Details of the Dispute:
+[Describe what happened, when, and the amount involved.]
+
+Request:
+I kindly request a refund or resolution of this matter.
+
+I can be reached at {email} for any additional information you may need.
+
+Best regards,
+{name}
+"""
+}
+
+
+class CompiledTemplate:
+    """A letter template split into literal and placeholder segments once"""
+
+    def __init__(self, name, text):
+        self.name = name
+        self.segments = []
+        self.placeholders = []
+        for literal, field, _, _ in string.Formatter().parse(text):
+            self.segments.append((literal, field))
+            if field and field not in self.placeholders:
+                self.placeholders.append(field)
+
+    def render(self, context):
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field:
+                parts.append(context.get(field) or "")
+        return "".join(parts)
+
+    def missing(self, context):
+        """Placeholders that have no value in context"""
+        return [field for field in self.placeholders if not context.get(field)]
+
+
+class TemplateRegistry:
+    """Letter templates keyed by categorize_dispute's suggested_template names"""
+
+    def __init__(self, templates=None):
+        self._sources = dict(templates or {})
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, text):
+        with self._lock:
+            self._sources[name] = text
+            self._compiled.pop(name, None)
+
+    def names(self):
+        return list(self._sources)
+
+    def __contains__(self, name):
+        return name in self._sources
+
+    def get(self, name):
+        """Compiled template for name, or None when no template is registered"""
+        compiled = self._compiled.get(name)
+        if compiled is None:
+            with self._lock:
+                text = self._sources.get(name)
+                if text is None:
+                    return None
+                compiled = self._compiled[name] = CompiledTemplate(name, text)
+        return compiled
+
+    def render(self, name, info):
+        template = self.get(name)
+        if template is None:
+            raise KeyError(f"No letter template registered for {name}")
+        return template.render(build_context(info))
+
+
+def build_context(info):
+    """Flatten an extracted case (personal/contact/dispute) into template values"""
+    personal = info.get("personal") or {}
+    contact = info.get("contact") or {}
+    dispute = info.get("dispute") or {}
+    first_name = personal.get("first_name") or ""
+    last_name = personal.get("last_name") or ""
+    return {
+        "name": f"{first_name} {last_name}".strip(),
+        "first_name": first_name,
+        "last_name": last_name,
+        "ets_id": personal.get("ets_id") or "",
+        "email": personal.get("email") or "",
+        "contact_email": contact.get("contact_email") or "",
+        "contact_phone": contact.get("contact_phone") or "",
+        "category": dispute.get("dispute_category") or "",
+        "date": datetime.date.today().isoformat()
+    }
+
+
+def suggested_template(info):
+    dispute = info.get("dispute") or {}
+    return dispute.get("suggested_template") or "general_dispute"
+
+
+registry = TemplateRegistry(LETTER_TEMPLATES)
+
+
+def render_letter(info, template_name=None, fallback="general_dispute"):
+    """Render the letter for a case using its suggested template.
+
+    Like render_bulk, a template that is not registered (e.g. one named by
+    register_category before it was added) falls back to the general letter.
+    """
+    name = template_name or suggested_template(info)
+    if registry.get(name) is None:
+        name = fallback
+    return registry.render(name, info)
+
+
+def render_bulk(cases, output_dir=None, zip_path=None, fallback="general_dispute"):
+    """Render letters for an iterable of cases into a directory and/or zip file.
+
+    Cases are consumed one at a time, so the iterator can be a generator over a
+    large archive. Returns throughput, per-template counts, cases whose suggested
+    template is not registered, and placeholders that had no value.
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    archive = zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) if zip_path else None
+
+    rendered = Counter()
+    unregistered = Counter()
+    missing_placeholders = {}
+    count = 0
+    start = time.perf_counter()
+    try:
+        for index, info in enumerate(cases):
+            name = suggested_template(info)
+            template = registry.get(name)
+            if template is None:
+                unregistered[name] += 1
+                name = fallback
+                template = registry.get(fallback)
+            context = build_context(info)
+            letter = template.render(context)
+            for field in template.missing(context):
+                missing_placeholders.setdefault(name, Counter())[field] += 1
+
+            case_id = info.get("case_id") or f"{index:06d}"
+            filename = f"{case_id}_{name}.txt"
+            if output_dir:
+                with open(os.path.join(output_dir, filename), "w", encoding="utf-8") as f:
+                    f.write(letter)
+            if archive:
+                archive.writestr(filename, letter)
+            rendered[name] += 1
+            count += 1
+    finally:
+        if archive:
+            archive.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        "letters": count,
+        "elapsed": round(elapsed, 3),
+        "letters_per_second": round(count / elapsed, 1) if elapsed else 0,
+        "by_template": dict(rendered),
+        "unregistered_templates": dict(unregistered),
+        "missing_placeholders": {name: dict(fields) for name, fields in missing_placeholders.items()}
+    }
+
+
+def iter_batch_cases(results_path):
+    """Yield cases from a batch_processor JSON lines file, skipping failed images"""
+    import json
+
+    with open(results_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if not record.get("success"):
+                continue
+            result = record["result"]
+            yield {
+                "case_id": os.path.splitext(os.path.basename(record["image"]))[0],
+                "personal": result.get("personal_info"),
+                "dispute": result
+            }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Render dispute letters for batch results")
+    parser.add_argument("results", help="JSON lines file written by batch_processor.py")
+    parser.add_argument("-d", "--output-dir", help="Directory to write one letter per case")
+    parser.add_argument("-z", "--zip", help="Zip file to write the letters into")
+    args = parser.parse_args()
+
+    if not (args.output_dir or args.zip):
+        parser.error("one of --output-dir or --zip is required")
+    print(json.dumps(render_bulk(iter_batch_cases(args.results), args.output_dir, args.zip), indent=4))
@@ -0,0 +1,186 @@
+import contextlib
+import contextvars
+import threading
+import time
+import uuid
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+
+
+def new_trace_id():
+    """Start a new trace in the current context and return its ID"""
+    trace_id = uuid.uuid4().hex
+    _trace_id.set(trace_id)
+    return trace_id
+
+
+def set_trace_id(trace_id):
+    """Set the trace ID for the current context; returns a token for reset_trace_id"""
+    return _trace_id.set(trace_id)
+
+
+def reset_trace_id(token):
+    _trace_id.reset(token)
+
+
+def current_trace_id():
+    return _trace_id.get()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    type = "counter"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Cumulative histogram with optional labels"""
+
+    type = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self._values.items()]
+        for key, counts, count, total in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, [("le", repr(float(bound)))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key, [("le", "+Inf")])
+            yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {total}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callback at scrape time.
+
+    The callback returns a number, or a dict mapping a label value to a number.
+    """
+
+    def __init__(self, name, help_text, func, metric_type="gauge", labelname=None):
+        self.name = name
+        self.help = help_text
+        self.func = func
+        self.type = metric_type
+        self.labelname = labelname
+
+    def samples(self):
+        try:
+            value = self.func()
+        except Exception:
+            return
+        if isinstance(value, dict):
+            for label, number in value.items():
+                yield f"{self.name}{_format_labels((self.labelname,), (label,))} {number}"
+        elif value is not None:
+            yield f"{self.name} {value}"
+
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def register(metric):
+    """Add a metric to the registry (replacing one with the same name)"""
+    with _registry_lock:
+        _registry[metric.name] = metric
+    return metric
+
+
+def register_callback(name, help_text, func, metric_type="gauge", labelname=None):
+    return register(CallbackMetric(name, help_text, func, metric_type, labelname))
+
+
+def render_prometheus():
+    """Render every registered metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+STAGE_LATENCY = register(Histogram(
+    "dispute_stage_duration_seconds", "Time spent in each pipeline stage", ["stage"]))
+STAGE_ERRORS = register(Counter(
+    "dispute_stage_errors_total", "Pipeline stage failures", ["stage"]))
+CALL_OUTCOMES = register(Counter(
+    "dispute_calls_total", "Outbound call attempts by outcome", ["outcome"]))
+OCR_LADDER_FINISHED = register(Counter(
+    "dispute_ocr_ladder_finished_total", "Images by the OCR ladder rung they finished on", ["rung"]))
+
+
+@contextlib.contextmanager
+def timed(stage):
+    """Time a block (or, as a decorator, a function) as a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
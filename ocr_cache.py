@@ -0,0 +1,146 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ocr_cache")
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def make_cache_key(image_bytes, tesseract_version, lang, config):
+    """Content-addressed key: image bytes plus everything that changes Tesseract's output"""
+    digest = hashlib.sha256()
+    digest.update(image_bytes)
+    for part in (str(tesseract_version), lang or "", config or ""):
+        digest.update(b"\0")
+        digest.update(part.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class OCRCache:
+    """On-disk OCR text cache with size-bounded LRU eviction"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = None  # key -> size, oldest first
+        self._total_bytes = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _load_index(self):
+        if self._index is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".txt"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def get(self, key):
+        """Return cached text for key, or None on a miss"""
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError:
+                self._total_bytes -= self._index.pop(key, 0)
+                self.misses += 1
+                return None
+            # Touch the entry so eviction order survives restarts
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            if key in self._index:
+                self._index.move_to_end(key)
+            else:
+                self._index[key] = os.path.getsize(path)
+                self._total_bytes += self._index[key]
+            self.hits += 1
+            return text
+
+    def put(self, key, text):
+        """Store text under key and evict least recently used entries"""
+        data = text.encode("utf-8")
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Error writing OCR cache: {str(e)}")
+                return
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._total_bytes += len(data)
+            self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            self._load_index()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups * 100, 2) if lookups else 0,
+                "entries": len(self._index),
+                "size_bytes": self._total_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_ocr_cache():
+    """Return the process-wide OCR cache, configured from the environment"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache(
+                cache_dir=os.getenv("OCR_CACHE_DIR", DEFAULT_CACHE_DIR),
+                max_bytes=int(os.getenv("OCR_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            )
+        return _cache
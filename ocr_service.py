@@ -0,0 +1,236 @@
+import os
+import queue
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+
+PAGE_SEPARATOR = "\f"
+
+TSV_HEADER = "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext"
+
+
+class OCRTimeoutError(Exception):
+    """Raised when Tesseract does not finish an image within its timeout"""
+
+
+class OCRError(Exception):
+    """Raised when Tesseract fails on an image"""
+
+
+def parse_tsv(tsv):
+    """Turn Tesseract TSV output into (text, mean word confidence 0-100)"""
+    paragraphs = []
+    confidences = []
+    previous = None
+    for row in tsv.splitlines():
+        cols = row.split("\t")
+        if len(cols) < 12 or cols[0] != "5" or not cols[11].strip():
+            continue
+        # (page, block, paragraph, line) of this word
+        position = tuple(cols[1:5])
+        if previous is None or position[:3] != previous[:3]:
+            paragraphs.append([[]])
+        elif position[3] != previous[3]:
+            paragraphs[-1].append([])
+        previous = position
+        paragraphs[-1][-1].append(cols[11])
+        confidence = float(cols[10])
+        if confidence >= 0:
+            confidences.append(confidence)
+    # Lines within a paragraph on their own rows, paragraphs split by a blank line like image_to_string
+    text = "\n\n".join("\n".join(" ".join(words) for words in paragraph) for paragraph in paragraphs)
+    return text, (sum(confidences) / len(confidences) if confidences else 0.0)
+
+
+def _split_tsv(output, count):
+    """Split multi-image TSV output by page_num; None if the pages do not line up"""
+    pages = {}
+    for row in output.splitlines():
+        cols = row.split("\t")
+        if len(cols) < 2 or not cols[1].isdigit():
+            continue
+        pages.setdefault(int(cols[1]), []).append(row)
+    if sorted(pages) != list(range(1, count + 1)):
+        return None
+    return [TSV_HEADER + "\n" + "\n".join(pages[number]) + "\n" for number in range(1, count + 1)]
+
+
+class _Request:
+    __slots__ = ("image", "lang", "config", "output", "future")
+
+    def __init__(self, image, lang, config, output="txt"):
+        self.image = image
+        self.lang = lang
+        self.config = config
+        self.output = output
+        self.future = Future()
+
+
+class OCRService:
+    """Long-lived OCR workers that batch queued images into multi-image Tesseract runs.
+
+    Tesseract reads a list file of image paths and writes every page to stdout
+    separated by form feeds, so a batch of N images pays the process start and
+    language model load once instead of N times.
+    """
+
+    def __init__(self, workers=None, batch_size=8, batch_wait=0.02, timeout=30.0, tesseract_cmd=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.timeout = timeout
+        self.tesseract_cmd = tesseract_cmd or os.getenv("TESSERACT_CMD", "tesseract")
+        self._queue = queue.Queue()
+        self._threads = []
+        self._started = False
+        self._lock = threading.Lock()
+        self._stats = {"images": 0, "batches": 0, "fallbacks": 0, "timeouts": 0, "errors": 0}
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ocr-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, image, lang="eng", config="", output="txt"):
+        """Queue a PIL image for OCR; returns a Future with the text (or TSV when output="tsv")"""
+        self._ensure_started()
+        request = _Request(image, lang or "eng", config or "", output)
+        self._queue.put(request)
+        return request.future
+
+    def image_to_string(self, image, lang="eng", config="", timeout=None):
+        """Blocking OCR of one PIL image, a drop-in for pytesseract.image_to_string"""
+        return self.submit(image, lang, config).result(timeout=timeout)
+
+    def image_to_data(self, image, lang="eng", config="", timeout=None):
+        """Blocking OCR of one PIL image returning TSV, like pytesseract.image_to_data"""
+        return self.submit(image, lang, config, "tsv").result(timeout=timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["workers"] = self.workers
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch_size"] = round(stats["images"] / stats["batches"], 2) if stats["batches"] else 0
+        return stats
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect_batch()
+            # Images can only share a Tesseract run when they share language, config and output
+            groups = {}
+            for request in batch:
+                groups.setdefault((request.lang, request.config, request.output), []).append(request)
+            for (lang, config, output), requests in groups.items():
+                try:
+                    self._run_group(requests, lang, config, output)
+                except Exception as e:
+                    for request in requests:
+                        if not request.future.done():
+                            request.future.set_exception(e)
+
+    def _command(self, input_path, lang, config, output="txt"):
+        # Config files such as "tsv" have to come after every option
+        return ([self.tesseract_cmd, input_path, "stdout", "-l", lang]
+                + shlex.split(config) + ["-c", "page_separator=" + PAGE_SEPARATOR]
+                + (["tsv"] if output == "tsv" else []))
+
+    def _run(self, input_path, lang, config, timeout, output="txt"):
+        try:
+            result = subprocess.run(
+                self._command(input_path, lang, config, output),
+                capture_output=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            raise OCRTimeoutError(f"Tesseract timed out after {timeout}s")
+        if result.returncode != 0:
+            raise OCRError(result.stderr.decode("utf-8", "replace").strip() or "Tesseract failed")
+        return result.stdout.decode("utf-8", "replace")
+
+    def _run_group(self, requests, lang, config, output="txt"):
+        with tempfile.TemporaryDirectory(prefix="ocr-batch-") as tmp_dir:
+            paths = []
+            for i, request in enumerate(requests):
+                path = os.path.join(tmp_dir, f"{i}.png")
+                request.image.save(path, format="PNG")
+                paths.append(path)
+
+            self._count("batches")
+            self._count("images", len(requests))
+            if len(requests) > 1:
+                list_path = os.path.join(tmp_dir, "images.txt")
+                with open(list_path, "w", encoding="utf-8") as f:
+                    f.write("\n".join(paths) + "\n")
+                try:
+                    result = self._run(list_path, lang, config, self.timeout * len(requests), output)
+                    if output == "tsv":
+                        pages = _split_tsv(result, len(requests))
+                    else:
+                        pages = result.split(PAGE_SEPARATOR)
+                        # Every page ends with a separator, so expect one extra (empty) part
+                        if len(pages) == len(requests) + 1:
+                            pages = [page + PAGE_SEPARATOR for page in pages[:-1]]
+                        else:
+                            pages = None
+                    if pages is not None:
+                        for request, page in zip(requests, pages):
+                            request.future.set_result(page)
+                        return
+                except (OCRError, OCRTimeoutError):
+                    pass
+                # Batch failed or pages did not line up: isolate images one by one
+                self._count("fallbacks")
+
+            for request, path in zip(requests, paths):
+                try:
+                    request.future.set_result(self._run(path, lang, config, self.timeout, output))
+                except OCRTimeoutError as e:
+                    self._count("timeouts")
+                    request.future.set_exception(e)
+                except Exception as e:
+                    self._count("errors")
+                    request.future.set_exception(e)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_ocr_service():
+    """Return the process-wide OCR service, or None when OCR_WORKERS=0 disables it"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            workers = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+            if workers <= 0:
+                return None
+            _service = OCRService(
+                workers=workers,
+                batch_size=int(os.getenv("OCR_BATCH_SIZE", 8)),
+                batch_wait=float(os.getenv("OCR_BATCH_WAIT", 0.02)),
+                timeout=float(os.getenv("OCR_TIMEOUT", 30))
+            )
+        return _service
@@ -0,0 +1,167 @@
+import io
+
+from dispute_assistant import (
+    extract_text_from_image, match_category_keywords, summarize_category_matches, read_image_bytes
+)
+from field_extraction import scan_fields
+from metrics import timed
+from startup import lazy_import
+
+PERSONAL_FIELDS = ("email", "first_name", "last_name", "ets_id")
+REQUIRED_FIELDS = ("first_name", "last_name", "ets_id", "email", "contact_phone")
+
+
+def _row_profile(img):
+    """Mean brightness of every pixel row"""
+    gray = img.convert("L")
+    return list(gray.resize((1, gray.height), lazy_import("PIL.Image").BOX).getdata())
+
+
+def split_tall_image(img, max_ratio=3.0, search=0.15):
+    """Yield page-sized slices of a stacked screenshot, cutting on the blankest nearby row"""
+    page_height = int(img.width * max_ratio)
+    if img.height <= page_height:
+        yield img
+        return
+    profile = _row_profile(img)
+    top = 0
+    while img.height - top > page_height:
+        target = top + page_height
+        window = range(max(top + 1, int(target - page_height * search)), target)
+        cut = max(window, key=lambda row: (profile[row], row))
+        yield img.crop((0, top, img.width, cut))
+        top = cut
+    yield img.crop((0, top, img.width, img.height))
+
+
+def iter_pages(source, max_ratio=3.0):
+    """Yield the pages of a document one at a time.
+
+    source is an image (path, bytes or file-like) or a list of them. Multi-frame
+    images (e.g. TIFF) yield one page per frame, and very tall stacked
+    screenshots are split into page-sized slices. Frames are decoded lazily.
+    """
+    sources = source if isinstance(source, (list, tuple)) else [source]
+    Image = lazy_import("PIL.Image")
+    for item in sources:
+        img = Image.open(io.BytesIO(read_image_bytes(item)))
+        for frame in range(getattr(img, "n_frames", 1)):
+            img.seek(frame)
+            yield from split_tall_image(img.copy(), max_ratio)
+
+
+def ocr_pages(source, max_ratio=3.0, **ocr_kwargs):
+    """Yield (page_number, text) as each page is OCR'd"""
+    for number, page in enumerate(iter_pages(source, max_ratio), start=1):
+        buffer = io.BytesIO()
+        page.save(buffer, format="PNG")
+        del page
+        yield number, extract_text_from_image(buffer.getvalue(), **ocr_kwargs) or ""
+
+
+class IncrementalExtraction:
+    """Field values and keyword matches accumulated page by page"""
+
+    def __init__(self):
+        self.personal = {field: None for field in PERSONAL_FIELDS}
+        self.contact = {"contact_email": None, "contact_phone": None}
+        self._contact_priority = {"contact_email": 0, "contact_phone": 0}
+        self.keywords = {}
+        self.history = []
+        self.pages = 0
+
+    def update(self, text):
+        self.pages += 1
+        for candidate in scan_fields(text):
+            # Personal fields keep the earliest value, like extract_personal_info
+            if candidate.field in self.personal and self.personal[candidate.field] is None:
+                self.personal[candidate.field] = candidate.value
+            # Contact fields keep the highest priority value, like extract_contact_info
+            key = f"contact_{candidate.field}"
+            if key in self.contact and candidate.priority > self._contact_priority[key]:
+                self.contact[key] = candidate.value
+                self._contact_priority[key] = candidate.priority
+        for category, hits in match_category_keywords(text).items():
+            self.keywords.setdefault(category, set()).update(hits)
+        category = self.category()
+        self.history.append((category["primary_category"], category["confidence"]))
+        return category
+
+    def category(self):
+        return summarize_category_matches({category: len(hits) for category, hits in self.keywords.items()})
+
+    def missing_fields(self, required=REQUIRED_FIELDS):
+        values = dict(self.personal, **self.contact)
+        return [field for field in required if not values.get(field)]
+
+    def is_stable(self, stable_pages=1, tolerance=5.0):
+        """True when the primary category and confidence held for the last stable_pages pages"""
+        if len(self.history) <= stable_pages:
+            return False
+        recent = self.history[-(stable_pages + 1):]
+        categories = {primary for primary, _ in recent}
+        confidences = [confidence for _, confidence in recent]
+        return len(categories) == 1 and "general" not in categories \
+            and max(confidences) - min(confidences) <= tolerance
+
+    def result(self):
+        category = self.category()
+        return {
+            "personal_info": dict(self.personal),
+            "contact": dict(self.contact),
+            "dispute_category": category["primary_category"],
+            "confidence": category["confidence"],
+            "category_details": category["all_matches"],
+            "suggested_template": category["suggested_template"],
+            "pages_processed": self.pages
+        }
+
+
+def stream_document(source, required=REQUIRED_FIELDS, stable_pages=1, tolerance=5.0, max_ratio=3.0,
+                    **ocr_kwargs):
+    """OCR a document page by page, yielding progress after every page.
+
+    Stops once every required field is found and the category is stable, so
+    long documents only pay for the pages they need. Only the current page is
+    held in memory. The last item yielded has "done": True.
+    """
+    state = IncrementalExtraction()
+    early_exit = False
+    for number, text in ocr_pages(source, max_ratio, **ocr_kwargs):
+        with timed("page_extract"):
+            category = state.update(text)
+        missing = state.missing_fields(required)
+        early_exit = not missing and state.is_stable(stable_pages, tolerance)
+        yield {
+            "done": False,
+            "page": number,
+            "missing_fields": missing,
+            "dispute_category": category["primary_category"],
+            "confidence": category["confidence"]
+        }
+        if early_exit:
+            break
+    result = state.result()
+    result["done"] = True
+    result["early_exit"] = early_exit
+    result["missing_fields"] = state.missing_fields(required)
+    yield result
+
+
+def process_document(source, **kwargs):
+    """Run stream_document to completion and return the final result"""
+    result = None
+    for result in stream_document(source, **kwargs):
+        pass
+    return result
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) < 2:
+        print("Usage: python page_stream.py <image> [<image> ...]")
+        sys.exit(1)
+    for progress in stream_document(sys.argv[1:]):
+        print(json.dumps(progress))
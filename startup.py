@@ -0,0 +1,55 @@
+import importlib
+import sys
+import threading
+import time
+
+_START = time.perf_counter()
+
+# Modules that are expensive to import and only needed by some code paths
+HEAVY_MODULES = ("pytesseract", "PIL", "requests", "dotenv", "numpy", "scipy")
+
+_marks = []
+_lazy_loads = {}
+_lock = threading.Lock()
+
+
+def mark(name):
+    """Record a startup milestone, in milliseconds since this module was imported"""
+    with _lock:
+        _marks.append((name, round((time.perf_counter() - _START) * 1000, 2)))
+
+
+def lazy_import(module_name):
+    """Import a module on first use and record how long that first import took"""
+    module = sys.modules.get(module_name)
+    # A module another thread is still importing is in sys.modules half-initialized;
+    # fall through to import_module, which waits for that import to finish
+    if module is not None and not getattr(getattr(module, "__spec__", None), "_initializing", False):
+        return module
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _lazy_loads.setdefault(module_name, round((time.perf_counter() - start) * 1000, 2))
+    return module
+
+
+def startup_report():
+    """Milestones, lazily loaded modules and which heavy dependencies are in memory"""
+    with _lock:
+        return {
+            "uptime_ms": round((time.perf_counter() - _START) * 1000, 2),
+            "marks": dict(_marks),
+            "lazy_loads_ms": dict(_lazy_loads),
+            "heavy_modules_loaded": [name for name in HEAVY_MODULES if name in sys.modules]
+        }
+
+
+def print_startup_report(label):
+    report = startup_report()
+    print(f"\n{label} startup report:")
+    for name, ms in report["marks"].items():
+        print(f"  {name}: {ms} ms")
+    for name, ms in report["lazy_loads_ms"].items():
+        print(f"  loaded {name} on first use: {ms} ms")
+    loaded = ", ".join(report["heavy_modules_loaded"]) or "none"
+    print(f"  heavy modules in memory: {loaded}")
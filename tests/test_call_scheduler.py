@@ -0,0 +1,94 @@
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from call_scheduler import COMPLETED, FAILED, UNKNOWN, CallScheduler
+from case_store import CaseStore
+from fake_twilio import FakeTwilio
+
+ACCOUNT = "AC" + "0" * 32
+NUMBER = "+15551230000"
+FROM_NUMBER = "+15559999999"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CaseStore(str(tmp_path / "cases.db"))
+
+
+def make_scheduler(store, twilio, **kwargs):
+    options = dict(accounts={ACCOUNT: "token"}, rate=50.0, burst=1, max_concurrent=1, retry_backoff=0.05,
+                   poll_interval=0.01, status_timeout=1.0, base_url=twilio.base_url)
+    options.update(kwargs)
+    return CallScheduler(store, **options)
+
+
+def enqueue_cases(store, scheduler, count):
+    for i in range(count):
+        case_id = store.save_case({"personal": {"first_name": f"Case{i}"}})
+        scheduler.enqueue(case_id, NUMBER, FROM_NUMBER, script="Follow-up call")
+
+
+def test_dropped_create_does_not_adopt_another_cases_call(store):
+    with FakeTwilio({NUMBER: ["completed", "dropped", "completed"]}) as twilio:
+        scheduler = make_scheduler(store, twilio)
+        enqueue_cases(store, scheduler, 2)
+        scheduler.run_until_idle(timeout=20)
+
+    calls = store.scheduled_calls()
+    assert [call["status"] for call in calls] == [COMPLETED, COMPLETED]
+    assert calls[0]["sid"] != calls[1]["sid"]
+    assert {call["sid"] for call in calls} == set(twilio.calls)
+    assert len(twilio.requests) == 3
+
+
+def test_ambiguous_call_is_left_unknown(store):
+    with FakeTwilio({NUMBER: ["completed", "lost"]}) as twilio:
+        # Someone else's call to the same number, placed just before ours
+        twilio.create(ACCOUNT, {"To": NUMBER, "From": FROM_NUMBER})
+        scheduler = make_scheduler(store, twilio)
+        enqueue_cases(store, scheduler, 1)
+        scheduler.run_until_idle(timeout=20)
+
+    call = store.scheduled_calls()[0]
+    assert call["status"] == FAILED
+    assert call["last_outcome"] == UNKNOWN
+    assert call["sid"] is None
+    assert len(twilio.requests) == 2
+
+
+def test_status_callback_matches_lost_call_exactly(store):
+    class CallbackHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            query = parse_qs(urlsplit(self.path).query)
+            form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8"))
+            store.set_callback_sid(int(query["scheduled_call"][0]), int(query["attempt"][0]), form["CallSid"][0])
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    callbacks = ThreadingHTTPServer(("127.0.0.1", 0), CallbackHandler)
+    threading.Thread(target=callbacks.serve_forever, daemon=True).start()
+    try:
+        with FakeTwilio({NUMBER: ["completed", "lost"]}) as twilio:
+            twilio.create(ACCOUNT, {"To": NUMBER, "From": FROM_NUMBER})
+            scheduler = make_scheduler(store, twilio, callback_base_url=f"http://127.0.0.1:{callbacks.server_port}")
+            enqueue_cases(store, scheduler, 1)
+            scheduler.run_until_idle(timeout=20)
+    finally:
+        callbacks.shutdown()
+        callbacks.server_close()
+
+    call = store.scheduled_calls()[0]
+    lost_sid = list(twilio.calls)[1]
+    assert call["status"] == COMPLETED
+    assert call["sid"] == lost_sid
+    assert len(twilio.requests) == 2
@@ -0,0 +1,71 @@
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+Image = pytest.importorskip("PIL.Image")
+
+from benchmark import DOCUMENT_KINDS, render_document
+from case_store import CaseStore
+from image_hash import DuplicateIndex, dhash
+
+ACCOUNT = "AC" + "0" * 32
+VALUES = {"first": "Maria", "last": "Garcia", "ets_id": "123456789", "email": "maria.garcia@example.com"}
+
+
+def render_form(**values):
+    text = "\n".join(line.format(**dict(VALUES, **values)) for line in DOCUMENT_KINDS["ets"])
+    return render_document(text, (1080, 1920))
+
+
+def encode(img, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+@pytest.fixture(scope="module")
+def original():
+    return render_form()
+
+
+@pytest.fixture(params=["memory", "store"])
+def index(request, original, tmp_path):
+    store = CaseStore(str(tmp_path / "cases.db")) if request.param == "store" else None
+    index = DuplicateIndex(threshold=4, store=store)
+    index.add(ACCOUNT, "personal", dhash(original), original, "case-1", "Maria Garcia 123456789", 1.5)
+    return index
+
+
+def copies(original):
+    img = Image.open(io.BytesIO(original))
+    return {
+        "jpeg": encode(img.convert("RGB"), "JPEG", quality=85),
+        "crop": encode(img.crop((5, 5, img.width - 5, img.height - 5)), "PNG"),
+        "rescale": encode(img.resize((1170, 2080), Image.LANCZOS), "PNG"),
+    }
+
+
+@pytest.mark.parametrize("copy", ["jpeg", "crop", "rescale"])
+def test_copies_reuse_text(index, original, copy):
+    data = copies(original)[copy]
+    match = index.lookup(ACCOUNT, "personal", dhash(data), data)
+    assert match is not None
+    assert match["case_id"] == "case-1"
+    assert match["text"] == "Maria Garcia 123456789"
+
+
+@pytest.mark.parametrize("values", [{"first": "Anna"}, {"first": "Mario"}, {"ets_id": "123456788"}])
+def test_other_typed_text_is_not_reused(index, values):
+    data = render_form(**values)
+    assert index.lookup(ACCOUNT, "personal", dhash(data), data) is None
+    assert index.unconfirmed == 1
+
+
+def test_lookup_is_scoped_to_account_and_image_type(index, original):
+    image_hash = dhash(original)
+    assert index.lookup("AC" + "1" * 32, "personal", image_hash, original) is None
+    assert index.lookup(ACCOUNT, "contact", image_hash, original) is None
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+DEFAULT_BASE_URL = "https://api.twilio.com"
+API_VERSION = "2010-04-01"
+
+# Responses where Twilio did not create the call, so a retry cannot place it twice
+RETRY_STATUS_CODES = (429, 503)
+
+# Status of a create request whose outcome is not known: it may have been
+# sent, so Twilio may have placed the call, and re-sending could call twice
+UNKNOWN_STATUS = "unknown"
+
+
+def request_not_sent(error):
+    """True when a requests error happened before the request reached the server"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if isinstance(error, requests.ConnectionError) and error.args:
+        # urllib3 wraps the cause in MaxRetryError; NewConnectionError means no connection was made
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class CallResponse:
+    """Structured result of a Calls API request"""
+
+    def __init__(self, success, status_code=None, sid=None, status=None, error=None,
+                 attempts=1, elapsed=0.0, data=None):
+        self.success = success
+        self.status_code = status_code
+        self.sid = sid
+        self.status = status
+        self.error = error
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.data = data or {}
+
+    def __bool__(self):
+        return self.success
+
+    @property
+    def unknown(self):
+        return self.status == UNKNOWN_STATUS
+
+    def to_dict(self):
+        return {
+            "success": self.success,
+            "status_code": self.status_code,
+            "sid": self.sid,
+            "status": self.status,
+            "error": self.error,
+            "attempts": self.attempts,
+            "elapsed": round(self.elapsed, 3)
+        }
+
+    def __repr__(self):
+        return f"CallResponse({self.to_dict()!r})"
+
+
+class TwilioCallClient:
+    """Connection-pooled Twilio Calls API client for one account"""
+
+    def __init__(self, account_sid, auth_token, base_url=None, timeout=10.0,
+                 max_retries=3, backoff=0.5, pool_size=10):
+        self.account_sid = account_sid
+        self.base_url = (base_url or os.getenv("TWILIO_API_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    @property
+    def calls_url(self):
+        return f"{self.base_url}/{API_VERSION}/Accounts/{self.account_sid}/Calls.json"
+
+    def create_call(self, to_number, from_number, twiml=None, url=None, status_callback=None,
+                    status_callback_event=None):
+        """Place a call with inline TwiML or a TwiML URL"""
+        payload = {"To": to_number, "From": from_number}
+        if twiml:
+            payload["Twiml"] = twiml
+        else:
+            payload["Url"] = url or "http://demo.twilio.com/docs/voice.xml"
+        if status_callback:
+            payload["StatusCallback"] = status_callback
+            if status_callback_event:
+                payload["StatusCallbackEvent"] = status_callback_event
+        return self._request("POST", self.calls_url, payload)
+
+    def get_call(self, sid):
+        """Fetch a call's current state; status is e.g. ringing, completed, busy or no-answer"""
+        return self._request("GET", f"{self.calls_url[:-len('.json')]}/{sid}.json")
+
+    def find_calls(self, to_number, from_number=None, since=None):
+        """Calls to to_number (and from from_number) created at or after since (epoch seconds), newest first.
+
+        Returns a CallResponse whose data["calls"] holds the matching call dicts.
+        Queued calls have no start time yet, so creation time is filtered here
+        rather than with the StartTime parameter.
+        """
+        params = {"To": to_number, "PageSize": 50}
+        if from_number:
+            params["From"] = from_number
+        result = self._request("GET", self.calls_url, params=params)
+        if result:
+            calls = result.data.get("calls") or []
+            if since is not None:
+                calls = [call for call in calls if _created_at(call) is None or _created_at(call) >= since]
+            result.data["calls"] = calls
+        return result
+
+    def _request(self, method, url, payload=None, params=None):
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self.session.request(method, url, data=payload, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                # A POST that may have reached Twilio is never re-sent
+                if method == "POST" and not request_not_sent(e):
+                    return CallResponse(False, status=UNKNOWN_STATUS, error=str(e), attempts=attempt,
+                                        elapsed=time.perf_counter() - start)
+                if attempt > self.max_retries:
+                    return CallResponse(False, error=str(e), attempts=attempt,
+                                        elapsed=time.perf_counter() - start)
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt > self.max_retries:
+                    return self._to_response(response, attempt, time.perf_counter() - start)
+            time.sleep(self.backoff * (2 ** (attempt - 1)))
+
+    @staticmethod
+    def _to_response(response, attempts, elapsed):
+        try:
+            data = response.json()
+        except ValueError:
+            data = {"message": response.text}
+        success = 200 <= response.status_code < 300
+        return CallResponse(
+            success,
+            status_code=response.status_code,
+            sid=data.get("sid"),
+            status=data.get("status"),
+            error=None if success else data.get("message") or response.reason,
+            attempts=attempts,
+            elapsed=elapsed,
+            data=data
+        )
+
+    def close(self):
+        self.session.close()
+
+
+def _created_at(call):
+    """Epoch seconds of a call's date_created (RFC 2822 in the API), or None"""
+    try:
+        return parsedate_to_datetime(call["date_created"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_call_client(account_sid, auth_token, base_url=None):
+    """Return the shared client for an account, creating it on first use"""
+    key = (account_sid, auth_token, base_url)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = TwilioCallClient(account_sid, auth_token, base_url)
+        return client
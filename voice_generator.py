@@ -1,14 +1,107 @@
+import functools
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from html import escape
+
+# Static TwiML fragments, built once
+_SAY_OPEN = '    <Say voice="alice" language="en-US">\n        '
+_SAY_CLOSE = '\n    </Say>\n'
+_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n<Response>\n'
+_FOOTER = (
+    '    <Pause length="2"/>\n'
+    + _SAY_OPEN + 'Thank you for listening. Goodbye.' + _SAY_CLOSE
+    + '</Response>\n'
+)
+
+_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".twiml_cache")
+
+
+@functools.lru_cache(maxsize=256)
 def generate_twiml(script):
     """生成 TwiML 语音脚本"""
-    twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
-<Response>
-    <Say voice="alice" language="en-US">
-        {script}
-    </Say>
-    <Pause length="2"/>
-    <Say voice="alice" language="en-US">
-        Thank you for listening. Goodbye.
-    </Say>
-</Response>
-"""
-    return twiml 
\ No newline at end of file
+    # The script carries user-derived names and IDs, so it must be XML escaped
+    return _HEADER + _SAY_OPEN + escape(script, quote=False) + _SAY_CLOSE + _FOOTER
+
+
+def twiml_hash(document):
+    return hashlib.sha256(document.encode("utf-8")).hexdigest()
+
+
+class TwiMLStore:
+    """Content-addressed TwiML documents on disk with a small in-memory LRU in front"""
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR, memory_size=256):
+        self.store_dir = store_dir
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, doc_hash):
+        return os.path.join(self.store_dir, f"{doc_hash}.xml")
+
+    def _remember(self, doc_hash, document):
+        self._memory[doc_hash] = document
+        self._memory.move_to_end(doc_hash)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def put(self, document):
+        """Store a document and return its hash; identical documents are written once"""
+        doc_hash = twiml_hash(document)
+        with self._lock:
+            if doc_hash in self._memory:
+                self._memory.move_to_end(doc_hash)
+                return doc_hash
+            path = self._path(doc_hash)
+            if not os.path.exists(path):
+                os.makedirs(self.store_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(document)
+                os.replace(tmp_path, path)
+            self._remember(doc_hash, document)
+        return doc_hash
+
+    def get(self, doc_hash):
+        """Return the document for a hash, or None if unknown"""
+        if not _HASH_PATTERN.fullmatch(doc_hash or ""):
+            return None
+        with self._lock:
+            document = self._memory.get(doc_hash)
+            if document is not None:
+                self._memory.move_to_end(doc_hash)
+                return document
+            try:
+                with open(self._path(doc_hash), "r", encoding="utf-8") as f:
+                    document = f.read()
+            except OSError:
+                return None
+            self._remember(doc_hash, document)
+            return document
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_twiml_store():
+    """Return the process-wide TwiML store, configured from TWIML_STORE_DIR"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = TwiMLStore(os.getenv("TWIML_STORE_DIR", DEFAULT_STORE_DIR))
+        return _store
+
+
+def publish_twiml(script, base_url=None):
+    """Render and store the TwiML for a script; returns its public URL, or None without a base URL"""
+    base_url = base_url or os.getenv("TWIML_BASE_URL")
+    if not base_url:
+        return None
+    doc_hash = get_twiml_store().put(generate_twiml(script))
+    return f"{base_url.rstrip('/')}/twiml/{doc_hash}"